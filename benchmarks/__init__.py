@@ -0,0 +1,31 @@
+"""
+Benchmarks for shadow. Run them from the repository root, e.g.
+
+    python -m benchmarks.extract_price
+"""
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    """Configure Django for a standalone benchmark script"""
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shadow.settings")
+    import django
+    django.setup()
+
+
+def use_temp_database(directory, name="bench.sqlite3"):
+    """Point the default database at a fresh file in `directory` and migrate it"""
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connections
+    # Drop any connection to the previous file first
+    connections.close_all()
+    settings.DATABASES["default"]["NAME"] = str(Path(directory) / name)
+    settings.DATABASES["default"].setdefault("OPTIONS", {})["timeout"] = 30
+    call_command("migrate", verbosity=0)
@@ -0,0 +1,114 @@
+"""
+Synthetic data for benchmarks: N users, each with a finance profile, M
+transactions spread over the last 90 days and K shopping items, all written
+with bulk_create.
+
+    python -m benchmarks.datagen --users 100 --transactions 1000 --items 50 [--db path.sqlite3]
+
+Without --db the data goes into a throwaway database and only the timings
+are printed; never point --db at a database you care about.
+"""
+import argparse
+import random
+import tempfile
+import time
+from decimal import Decimal
+
+from . import setup_django, use_temp_database
+
+PASSWORD = "bench-password"
+USERNAME_PREFIX = "bench"
+
+
+def generate(users, transactions, items, seed=1, batch_size=2000):
+    """
+    Seed the current database. Every user gets the same password (PASSWORD).
+    Returns the created User objects
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+    from widgets.models import DailySpend, FinanceProfile, ShoppingListItem, Transaction
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    # Hashing is deliberately slow, one hash serves every user
+    password = make_password(PASSWORD)
+    first = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+
+    created = User.objects.bulk_create(
+        [User(username=f"{USERNAME_PREFIX}{first + n}", password=password) for n in range(users)],
+        batch_size=batch_size,
+    )
+    profiles = FinanceProfile.objects.bulk_create([
+        FinanceProfile(user=user, total_funds=Decimal(rng.randint(50000, 500000)),
+                       monthly_income=Decimal(rng.choice([30000, 60000, 90000, 150000])))
+        for user in created
+    ], batch_size=batch_size)
+
+    def transaction_rows():
+        for profile in profiles:
+            for n in range(transactions):
+                transaction_type = "credit" if rng.random() < 0.2 else "debit"
+                yield Transaction(
+                    finance_profile=profile,
+                    amount=Decimal(rng.randint(100, 500000)) / 100,
+                    transaction_type=transaction_type,
+                    category="savings" if transaction_type == "credit" else rng.choice(["needs", "needs", "wants"]),
+                    description=f"synthetic {n}",
+                    created_at=now - timezone.timedelta(seconds=rng.randint(0, 90 * 24 * 3600)),
+                )
+
+    def item_rows():
+        for user in created:
+            for n in range(items):
+                yield ShoppingListItem(
+                    user=user,
+                    name=f"item {n}",
+                    price=Decimal(rng.randint(100, 2000000)) / 100,
+                    priority=rng.random() < 0.4,
+                )
+
+    for rows, model in ((transaction_rows(), Transaction), (item_rows(), ShoppingListItem)):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                model.objects.bulk_create(batch)
+                batch.clear()
+        if batch:
+            model.objects.bulk_create(batch)
+
+    # bulk_create skips Transaction.save(), so build the daily buckets here
+    DailySpend.rebuild(FinanceProfile.objects.filter(pk__in=[profile.pk for profile in profiles]))
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--transactions", type=int, default=1000, help="per user")
+    parser.add_argument("--items", type=int, default=50, help="shopping items per user")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", help="SQLite file to create or extend (migrated first)")
+    args = parser.parse_args()
+
+    setup_django()
+    with tempfile.TemporaryDirectory() as directory:
+        if args.db:
+            from django.conf import settings
+            from django.core.management import call_command
+            settings.DATABASES["default"]["NAME"] = args.db
+            call_command("migrate", verbosity=0)
+        else:
+            use_temp_database(directory)
+        started = time.perf_counter()
+        generate(args.users, args.transactions, args.items, seed=args.seed)
+        elapsed = time.perf_counter() - started
+    rows = args.users * (2 + args.transactions + args.items)
+    print(f"{args.users} users, {args.users * args.transactions} transactions, {args.users * args.items} items "
+          f"in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Mixed read/write throughput on SQLite: dashboard readers (finance snapshot,
+shopping list, recent transactions) running alongside ledger writers, under
+the development and the production (SHADOW_ENV=production) database profiles.
+Each profile gets a fresh copy of the same seeded database file and is run
+by several worker processes at once, like a multi-process app server.
+
+    python -m benchmarks.db_throughput [--processes 4] [--readers 2] [--writers 1] [--seconds 10] [--json out.json]
+
+--readers and --writers are threads per process.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from . import ROOT, setup_django
+
+PROFILES = ["development", "production"]
+
+
+def seed(users, transactions):
+    from django.core.management import call_command
+    from .datagen import generate
+    call_command("migrate", verbosity=0)
+    generate(users, transactions, items=20, seed=7)
+
+
+def run_workload(readers, writers, seconds):
+    """Run the mixed workload in this process, returns the counts"""
+    from django.db import connections
+    from widgets.finance import FinanceSnapshot
+    from widgets.ledger import post_transaction
+    from widgets.models import FinanceProfile
+    from widgets.operations import get_shopping_list
+
+    profile_ids = list(FinanceProfile.objects.values_list("pk", flat=True))
+    connections.close_all()
+    counts = {"reads": 0, "writes": 0, "read_errors": 0, "write_errors": 0}
+    latencies = {"reads": [], "writes": []}
+    lock = threading.Lock()
+    start_line = threading.Barrier(readers + writers)
+    deadline = [0]
+
+    def read(rng):
+        profile = FinanceProfile.objects.select_related("user").get(pk=rng.choice(profile_ids))
+        snapshot = FinanceSnapshot(profile)
+        snapshot.financial_score
+        list(get_shopping_list(profile.user))
+        list(profile.transactions.all()[:5])
+
+    def write(rng):
+        post_transaction(FinanceProfile(pk=rng.choice(profile_ids)), Decimal("12.50"),
+                         rng.choice(["debit", "credit"]), "wants", "benchmark", allow_overdraft=True)
+
+    def worker(kind, operation, seed):
+        rng = random.Random(seed)
+        start_line.wait()
+        if not deadline[0]:
+            deadline[0] = time.monotonic() + seconds
+        while time.monotonic() < deadline[0]:
+            started = time.perf_counter()
+            try:
+                operation(rng)
+            except Exception:
+                outcome = kind[:-1] + "_errors"
+            else:
+                outcome = kind
+            with lock:
+                counts[outcome] += 1
+                if outcome == kind:
+                    latencies[kind].append(time.perf_counter() - started)
+        connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=("reads", read, i)) for i in range(readers)]
+    threads += [threading.Thread(target=worker, args=("writes", write, 100 + i)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for kind, values in latencies.items():
+        values.sort()
+        counts[f"{kind}_per_s"] = counts[kind] / seconds
+        counts[f"{kind}_p99_ms"] = values[int(len(values) * 0.99)] * 1000 if values else None
+    return counts
+
+
+def combine(outputs):
+    """Sum the per-process counts; p99 is the worst process's"""
+    result = {}
+    for key in outputs[0]:
+        values = [output[key] for output in outputs if output[key] is not None]
+        if key.endswith("_p99_ms"):
+            result[key] = max(values) if values else None
+        else:
+            result[key] = sum(values)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--writers", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--transactions", type=int, default=500, help="seeded transactions per user")
+    parser.add_argument("--json", dest="json_path")
+    parser.add_argument("--worker", choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        # Child process: settings are read from the environment set by the parent
+        setup_django()
+        print(json.dumps(run_workload(args.readers, args.writers, args.seconds)))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        seeded = Path(directory) / "seed.sqlite3"
+        os.environ["SHADOW_DB_PATH"] = str(seeded)
+        setup_django()
+        seed(args.users, args.transactions)
+
+        report = []
+        print(f"{'profile':<13}{'reads/s':>9}{'writes/s':>10}{'read p99 ms':>13}{'write p99 ms':>14}"
+              f"{'read errs':>11}{'write errs':>12}")
+        for profile in PROFILES:
+            database = Path(directory) / f"{profile}.sqlite3"
+            shutil.copy(seeded, database)
+            env = dict(os.environ, SHADOW_ENV=profile, SHADOW_DB_PATH=str(database))
+            command = [sys.executable, "-m", "benchmarks.db_throughput", "--worker", profile,
+                       "--readers", str(args.readers), "--writers", str(args.writers), "--seconds", str(args.seconds)]
+            workers = [subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+                       for _ in range(args.processes)]
+            outputs = [json.loads(worker.communicate()[0].strip().splitlines()[-1]) for worker in workers]
+            result = combine(outputs)
+            print(f"{profile:<13}{result['reads_per_s']:>9.0f}{result['writes_per_s']:>10.0f}"
+                  f"{result['reads_p99_ms'] or 0:>13.1f}{result['writes_p99_ms'] or 0:>14.1f}"
+                  f"{result['read_errors']:>11}{result['write_errors']:>12}")
+            report.append(dict(result, profile=profile))
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Per-page latency and peak memory of price extraction over the saved corpus,
+comparing the prescan pipeline against the old full-tree implementation.
+
+    python -m benchmarks.extract_price [--repeat 20] [--inflate 10] [--json out.json]
+
+--inflate repeats each page's <body> content to simulate multi-megabyte
+product pages.
+"""
+import argparse
+import json
+import re
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from . import setup_django
+
+CORPUS = Path(__file__).resolve().parent / "corpus"
+
+
+def legacy_extract(html):
+    """extract_price as it was before the prescan pipeline: full tree first"""
+    from bs4 import BeautifulSoup
+    from widgets.operations import extract_jsonld_price, extract_meta_price, extract_text_price
+    soup = BeautifulSoup(html, "html.parser")
+    return extract_jsonld_price(soup) or extract_meta_price(soup) or extract_text_price(soup)
+
+
+def inflate(html, factor):
+    if factor <= 1:
+        return html
+    match = re.search(r"<main>(.*)</main>", html, re.DOTALL)
+    if not match:
+        return html
+    return html[:match.start(1)] + match.group(1) * factor + html[match.end(1):]
+
+
+def measure(func, html, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(html)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(html)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, statistics.median(timings) * 1000, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--inflate", type=int, default=1)
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    setup_django()
+    from widgets.operations import extract_price_from_html
+
+    expected = json.loads((CORPUS / "expected.json").read_text())
+    results = []
+    print(f"{'page':<28}{'size KB':>9}{'old ms':>10}{'new ms':>10}{'old KB peak':>13}{'new KB peak':>13}  new ok  old ok")
+    for name in sorted(expected):
+        html = inflate((CORPUS / name).read_text(), args.inflate)
+        old_price, old_ms, old_kb = measure(legacy_extract, html, args.repeat)
+        new_price, new_ms, new_kb = measure(extract_price_from_html, html, args.repeat)
+        ok = new_price == expected[name]
+        old_ok = old_price == expected[name]
+        print(f"{name:<28}{len(html) / 1024:>9.0f}{old_ms:>10.2f}{new_ms:>10.2f}{old_kb:>13.0f}{new_kb:>13.0f}"
+              f"  {'yes' if ok else 'NO':>6}  {'yes' if old_ok else 'no':>6}")
+        results.append({
+            "page": name, "bytes": len(html), "ok": ok, "old_ok": old_ok,
+            "old_ms": old_ms, "new_ms": new_ms, "old_peak_kb": old_kb, "new_peak_kb": new_kb,
+        })
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Parallel purchases against one finance profile, on a throwaway SQLite file.
+Checks that no balance update is lost and that the funds check holds under
+contention, and reports throughput. --legacy runs the old read-modify-write
++ profile.save() sequence for comparison.
+
+    python -m benchmarks.ledger_concurrency [--threads 8] [--buys 200] [--legacy] [--json out.json]
+"""
+import argparse
+import json
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from . import setup_django, use_temp_database
+
+PRICE = Decimal("10.00")
+
+
+def legacy_buy(profile_id):
+    """buy_item's balance handling before the ledger service"""
+    from widgets.models import FinanceProfile, Transaction
+    profile = FinanceProfile.objects.get(pk=profile_id)
+    if profile.total_funds < PRICE:
+        return False
+    Transaction.objects.create(finance_profile=profile, amount=PRICE, transaction_type="debit",
+                               category="wants", description="benchmark buy")
+    profile.total_funds -= PRICE
+    profile.save()
+    return True
+
+
+def ledger_buy(profile_id):
+    from widgets.ledger import InsufficientFunds, post_transaction
+    from widgets.models import FinanceProfile
+    try:
+        post_transaction(FinanceProfile(pk=profile_id), PRICE, "debit", "wants", "benchmark buy")
+    except InsufficientFunds:
+        return False
+    return True
+
+
+def run(buy, profile_id, threads, buys):
+    from django.db import connection
+    results = {"ok": 0, "rejected": 0, "errors": 0}
+    lock = threading.Lock()
+    start_line = threading.Barrier(threads)
+
+    def worker(count):
+        start_line.wait()
+        for _ in range(count):
+            try:
+                outcome = "ok" if buy(profile_id) else "rejected"
+            except Exception:
+                outcome = "errors"
+            with lock:
+                results[outcome] += 1
+        connection.close()
+
+    per_thread = [buys // threads + (1 if i < buys % threads else 0) for i in range(threads)]
+    workers = [threading.Thread(target=worker, args=(count,)) for count in per_thread]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    results["seconds"] = time.perf_counter() - started
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--buys", type=int, default=200)
+    parser.add_argument("--legacy", action="store_true", help="also run the old read-modify-write path")
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    setup_django()
+    with tempfile.TemporaryDirectory() as directory:
+        use_temp_database(directory, "ledger.sqlite3")
+        from django.contrib.auth.models import User
+        from django.db.models import Sum
+        from widgets.models import FinanceProfile
+
+        # Enough money for three quarters of the buys, so the funds check is exercised
+        opening = PRICE * (args.buys * 3 // 4)
+        modes = [("ledger", ledger_buy)] + ([("legacy", legacy_buy)] if args.legacy else [])
+        report = []
+        print(f"{'mode':<8}{'buys/s':>9}{'ok':>6}{'rejected':>10}{'errors':>8}{'balance':>12}{'expected':>12}  consistent")
+        for name, buy in modes:
+            user = User.objects.create(username=f"bench-{name}")
+            profile = FinanceProfile.objects.create(user=user, total_funds=opening)
+            results = run(buy, profile.pk, args.threads, args.buys)
+
+            profile.refresh_from_db()
+            spent = profile.transactions.aggregate(total=Sum("amount"))["total"] or 0
+            expected = opening - spent
+            consistent = profile.total_funds == expected and profile.total_funds >= 0
+            print(f"{name:<8}{args.buys / results['seconds']:>9.0f}{results['ok']:>6}{results['rejected']:>10}"
+                  f"{results['errors']:>8}{profile.total_funds:>12}{expected:>12}  {'yes' if consistent else 'NO'}")
+            report.append(dict(results, mode=name, balance=str(profile.total_funds),
+                               expected=str(expected), consistent=consistent))
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Rendering cost of finance.html and shopping.html before and after the
+production rendering profile:
+
+    before  templates loaded without the cached loader, no compression,
+            every page rendered in full
+    after   cached template loader, GZipMiddleware, and revalidation of an
+            unchanged page answered with 304 from its ETag
+
+"render" times the template alone (render_to_string with the page's
+context), "request" a full GET through the middleware with the page's data
+already cached, "304" a GET carrying the ETag from the previous response.
+
+    python -m benchmarks.render [--requests 200] [--transactions 500] [--items 100] [--json out.json]
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from . import setup_django, use_temp_database
+from .run import percentile
+
+UNCACHED_LOADERS = [
+    "django.template.loaders.filesystem.Loader",
+    "django.template.loaders.app_directories.Loader",
+]
+CACHED_LOADERS = [("django.template.loaders.cached.Loader", UNCACHED_LOADERS)]
+COMPRESSION = ["django.middleware.gzip.GZipMiddleware", "django.middleware.http.ConditionalGetMiddleware"]
+
+
+def templates_with(loaders):
+    from django.conf import settings
+    templates = [dict(engine, OPTIONS=dict(engine["OPTIONS"])) for engine in settings.TEMPLATES]
+    templates[0]["APP_DIRS"] = False
+    templates[0]["OPTIONS"]["loaders"] = loaders
+    return templates
+
+
+def profiles():
+    """(name, settings overrides, request headers, revalidate) for before and after"""
+    from django.conf import settings
+    plain = [name for name in settings.MIDDLEWARE if name not in COMPRESSION]
+    # Where shadow/settings.py has them: right after SecurityMiddleware
+    position = plain.index("django.middleware.security.SecurityMiddleware") + 1
+    return [
+        ("before", {"TEMPLATES": templates_with(UNCACHED_LOADERS), "MIDDLEWARE": plain}, {}, False),
+        ("after", {"TEMPLATES": templates_with(CACHED_LOADERS),
+                   "MIDDLEWARE": plain[:position] + COMPRESSION + plain[position:]},
+         {"HTTP_ACCEPT_ENCODING": "gzip, deflate, br"}, True),
+    ]
+
+
+def page_contexts(user):
+    """(page name, url, template, context builder) for the measured pages"""
+    from django.test import RequestFactory
+    from django.urls import reverse
+    from widgets.views import dashboard_context, shopping_table
+
+    def shopping_context():
+        request = RequestFactory().get(reverse("widget:shopping"))
+        request.user = user
+        return shopping_table(request)
+
+    return [
+        ("finance", reverse("widget:finance"), "finance.html", lambda: dashboard_context(user)),
+        ("shopping", reverse("widget:shopping"), "shopping.html", shopping_context),
+    ]
+
+
+def measure(client, user, requests, headers, revalidate):
+    from django.template.loader import render_to_string
+    from django.test import RequestFactory
+    results = {}
+    for page, url, template, build in page_contexts(user):
+        context = build()
+        request = RequestFactory().get(url)
+        request.user = user
+        render = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            render_to_string(template, context, request)
+            render.append(time.perf_counter() - started)
+
+        full, revalidated = [], []
+        response = client.get(url, **headers)
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.get(url, **headers)
+            full.append(time.perf_counter() - started)
+            if revalidate and response.has_header("ETag"):
+                started = time.perf_counter()
+                status = client.get(url, HTTP_IF_NONE_MATCH=response["ETag"], **headers).status_code
+                if status == 304:
+                    revalidated.append(time.perf_counter() - started)
+
+        results[page] = {
+            "render_p50_ms": round(statistics.median(render) * 1000, 3),
+            "request_p50_ms": round(statistics.median(full) * 1000, 3),
+            "request_p99_ms": round(percentile(full, 0.99) * 1000, 3),
+            "bytes": len(response.content),
+            "encoding": response.get("Content-Encoding"),
+            "304_p50_ms": round(statistics.median(revalidated) * 1000, 3) if revalidated else None,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="renders and requests per page and profile")
+    parser.add_argument("--transactions", type=int, default=500)
+    parser.add_argument("--items", type=int, default=100, help="shopping items")
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+    from django.test.utils import override_settings, setup_test_environment
+    from .datagen import generate
+    setup_test_environment()
+
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        use_temp_database(directory)
+        user = generate(1, args.transactions, args.items)[0]
+        for name, overrides, headers, revalidate in profiles():
+            with override_settings(**overrides):
+                client = Client()
+                client.force_login(user)
+                report[name] = measure(client, user, args.requests, headers, revalidate)
+
+    print(f"{'page':<10}{'profile':<9}{'render ms':>11}{'request ms':>12}{'p99 ms':>9}{'bytes':>9}{'304 ms':>9}")
+    for page in report["before"]:
+        for name in report:
+            result = report[name][page]
+            revalidated = f"{result['304_p50_ms']:.3f}" if result["304_p50_ms"] is not None else "-"
+            print(f"{page:<10}{name:<9}{result['render_p50_ms']:>11.3f}{result['request_p50_ms']:>12.3f}"
+                  f"{result['request_p99_ms']:>9.3f}{result['bytes']:>9}{revalidated:>9}")
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
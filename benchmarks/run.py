@@ -0,0 +1,181 @@
+"""
+Request-level benchmark of the main views through the Django test client,
+at several data scales. For every view it records p50/p99 latency and the
+number of SQL queries per request, and writes the results as JSON so runs
+from different commits can be compared.
+
+    python -m benchmarks.run [--scales small,medium] [--requests 50] [--json out.json] [--compare old.json]
+
+GET views are measured twice: "cold" with the cache cleared before every
+request and "warm" with each visitor's page already cached.
+"""
+import argparse
+import contextlib
+import json
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from . import ROOT, setup_django, use_temp_database
+
+# users, transactions per user, shopping items per user
+SCALES = {
+    "small": (10, 100, 10),
+    "medium": (50, 1000, 50),
+    "large": (100, 5000, 200),
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+@contextlib.contextmanager
+def count_queries():
+    """Queries run on any database alias inside the block"""
+    from django.db import connections
+    from django.test.utils import CaptureQueriesContext
+    with contextlib.ExitStack() as stack:
+        captures = [stack.enter_context(CaptureQueriesContext(connection)) for connection in connections.all()]
+        counter = {"count": 0}
+        yield counter
+    counter["count"] = sum(len(capture) for capture in captures)
+
+
+def timed(client, method, url, data=None):
+    with count_queries() as queries:
+        started = time.perf_counter()
+        response = getattr(client, method)(url, data or {})
+        elapsed = time.perf_counter() - started
+    if response.status_code >= 400:
+        raise RuntimeError(f"{method.upper()} {url} returned {response.status_code}")
+    return elapsed, queries["count"]
+
+
+def summarize(samples):
+    latencies = [latency for latency, _ in samples]
+    queries = [count for _, count in samples]
+    return {
+        "requests": len(samples),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "queries_p50": statistics.median(queries),
+        "queries_max": max(queries),
+    }
+
+
+def run_scale(users, transactions, items, requests, seed):
+    from django.core.cache import cache
+    from django.test import Client
+    from django.urls import reverse
+    from widgets.models import ShoppingListItem, Transaction
+    from .datagen import generate
+
+    created = generate(users, transactions, items, seed=seed)
+    rng = random.Random(seed)
+    clients = {}
+
+    def client_for(user):
+        if user.pk not in clients:
+            clients[user.pk] = Client()
+            clients[user.pk].force_login(user)
+        return clients[user.pk]
+
+    results = {}
+    for name, url in (("shopping_list", reverse("widget:shopping")), ("finance_view", reverse("widget:finance"))):
+        visitors = [rng.choice(created) for _ in range(requests)]
+        samples = []
+        for user in visitors:
+            cache.clear()
+            samples.append(timed(client_for(user), "get", url))
+        results[f"{name} (cold)"] = summarize(samples)
+        # One untimed visit each, so every timed request below is a cache hit
+        for user in set(visitors):
+            client_for(user).get(url)
+        results[f"{name} (warm)"] = summarize([timed(client_for(user), "get", url) for user in visitors])
+
+    # Writes: each request buys a different item / removes a different transaction
+    samples = []
+    for n in range(requests):
+        user = created[n % len(created)]
+        item = ShoppingListItem.objects.filter(user=user).order_by("?").first()
+        samples.append(timed(client_for(user), "post", reverse("widget:buy_item", args=[item.pk])))
+    results["buy_item"] = summarize(samples)
+
+    samples = []
+    for _ in range(requests):
+        user = rng.choice(created)
+        txn = Transaction.objects.filter(finance_profile__user=user).order_by("?").first()
+        samples.append(timed(client_for(user), "post", reverse("widget:remove_transaction"),
+                             {"transaction_id": txn.pk}))
+    results["remove_transaction"] = summarize(samples)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(report, baseline):
+    print(f"\ncompared with {baseline.get('revision') or 'baseline'}:")
+    for scale, views in report["scales"].items():
+        for view, result in views.items():
+            before = baseline.get("scales", {}).get(scale, {}).get(view)
+            if not before:
+                continue
+            change = (result["p50_ms"] / before["p50_ms"] - 1) * 100 if before["p50_ms"] else 0
+            print(f"  {scale:<8}{view:<26}p50 {before['p50_ms']:>8.2f} -> {result['p50_ms']:>8.2f} ms ({change:+.0f}%)"
+                  f"   queries {before['queries_p50']:g} -> {result['queries_p50']:g}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="small,medium", help=f"comma separated, from {', '.join(SCALES)}")
+    parser.add_argument("--requests", type=int, default=50, help="requests per view and scale")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path")
+    parser.add_argument("--compare", help="earlier --json output to compare against")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test.utils import setup_test_environment
+    import django
+    setup_test_environment()
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "requests": args.requests,
+        "scales": {},
+    }
+    for scale in args.scales.split(","):
+        users, transactions, items = SCALES[scale]
+        with tempfile.TemporaryDirectory() as directory:
+            use_temp_database(directory)
+            results = run_scale(users, transactions, items, args.requests, args.seed)
+        report["scales"][scale] = results
+
+        print(f"\n{scale}: {users} users x {transactions} transactions, {items} items")
+        print(f"{'view':<26}{'p50 ms':>9}{'p99 ms':>9}{'queries':>9}{'max':>6}")
+        for view, result in results.items():
+            print(f"{view:<26}{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                  f"{result['queries_p50']:>9g}{result['queries_max']:>6}")
+
+    if args.compare:
+        print_comparison(report, json.loads(Path(args.compare).read_text()))
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
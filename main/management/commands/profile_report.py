@@ -0,0 +1,60 @@
+from collections import Counter
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from pathlib import Path
+import io
+import pstats
+
+
+class Command(BaseCommand):
+    help = "Summarize the profiles in PROFILING_DIR into the hottest functions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help="Profile directory (defaults to PROFILING_DIR)")
+        parser.add_argument('--match', default='*', help="Only files whose name matches this glob, e.g. '*shopping-list*'")
+        parser.add_argument('--top', type=int, default=20)
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir'] or getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+        if not directory.is_dir():
+            raise CommandError(f"No profile directory at {directory}")
+        collapsed = sorted(directory.glob(f"{options['match']}.collapsed"))
+        stats = sorted(directory.glob(f"{options['match']}.prof"))
+        if not collapsed and not stats:
+            raise CommandError(f"No profiles matching {options['match']!r} in {directory}")
+
+        if collapsed:
+            self.report_samples(collapsed, options['top'])
+        if stats:
+            self.report_pstats(stats, options['top'])
+
+    def report_samples(self, paths, top):
+        own, total = Counter(), Counter()
+        samples = 0
+        for path in paths:
+            for line in path.read_text().splitlines():
+                stack, _, count = line.rpartition(" ")
+                if not stack:
+                    continue
+                count = int(count)
+                frames = stack.split(";")
+                samples += count
+                own[frames[-1]] += count
+                # A recursive function counts once per sample
+                for frame in set(frames):
+                    total[frame] += count
+
+        self.stdout.write(f"{samples} samples from {len(paths)} sampled profiles\n")
+        for title, counter in (("self", own), ("inclusive", total)):
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Top {top} functions by {title} samples"))
+            for frame, count in counter.most_common(top):
+                self.stdout.write(f"{count:>8} {count / samples:>7.1%}  {frame}")
+            self.stdout.write("")
+
+    def report_pstats(self, paths, top):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Top {top} functions by own time, {len(paths)} cProfile files"))
+        # OutputWrapper ends every write() with a newline, pstats writes in fragments
+        buffer = io.StringIO()
+        combined = pstats.Stats(*map(str, paths), stream=buffer)
+        combined.strip_dirs().sort_stats("tottime").print_stats(top)
+        self.stdout.write(buffer.getvalue())
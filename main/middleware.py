@@ -0,0 +1,216 @@
+"""
+Opt-in diagnostics middleware.
+
+QueryInstrumentationMiddleware: with SQL_INSTRUMENTATION on, every request's
+queries are timed through connection.execute_wrapper(); the totals go out in
+a Server-Timing header, and slow requests, slow queries and repeated
+identical SQL (N+1 patterns) are written to the "shadow.sql" log as JSON.
+
+ProfilingMiddleware: samples or cProfiles selected requests, see
+shadow/profiling.py.
+
+StaticFilesMiddleware: serves collectstatic output from STATIC_ROOT with
+far-future caching for hashed names and precompressed variants, see
+shadow/staticfiles.py.
+
+All of them remove themselves from the chain at startup when switched off
+"""
+from collections import defaultdict
+from contextlib import ExitStack
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+from pathlib import Path
+from shadow import profiling, staticfiles
+import json
+import logging
+import mimetypes
+import time
+
+logger = logging.getLogger("shadow.sql")
+
+
+class QueryRecorder:
+    """execute_wrapper hook collecting (sql, seconds) for one request"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((context["connection"].alias, sql, time.perf_counter() - started))
+
+    @property
+    def total_time(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    def repeated(self, threshold):
+        """The same SQL text run `threshold` or more times, most frequent first"""
+        groups = defaultdict(list)
+        for alias, sql, duration in self.queries:
+            groups[sql].append(duration)
+        return sorted(
+            ({"sql": sql, "count": len(durations), "total_ms": round(sum(durations) * 1000, 2)}
+             for sql, durations in groups.items() if len(durations) >= threshold),
+            key=lambda group: group["count"], reverse=True,
+        )
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, "SQL_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_request = getattr(settings, "SQL_SLOW_REQUEST_MS", 500) / 1000
+        self.slow_query = getattr(settings, "SQL_SLOW_QUERY_MS", 100) / 1000
+        self.repeat_threshold = getattr(settings, "SQL_REPEAT_THRESHOLD", 5)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        db_time = recorder.total_time
+        timing = (f'db;dur={db_time * 1000:.1f};desc="{len(recorder.queries)} queries", '
+                  f'app;dur={(elapsed - db_time) * 1000:.1f}, total;dur={elapsed * 1000:.1f}')
+        if response.has_header("Server-Timing"):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response["Server-Timing"] = timing
+
+        self.log(request, response, recorder, elapsed)
+        return response
+
+    def log(self, request, response, recorder, elapsed):
+        context = {
+            "time": timezone.now().isoformat(),
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+        }
+        for alias, sql, duration in recorder.queries:
+            if duration >= self.slow_query:
+                logger.warning(json.dumps(dict(
+                    context, event="slow_query", alias=alias, sql=sql, duration_ms=round(duration * 1000, 2))))
+
+        repeated = recorder.repeated(self.repeat_threshold)
+        if repeated:
+            logger.warning(json.dumps(dict(context, event="repeated_queries", queries=len(recorder.queries),
+                                           repeated=repeated)))
+        if elapsed >= self.slow_request:
+            logger.warning(json.dumps(dict(
+                context, event="slow_request", duration_ms=round(elapsed * 1000, 2),
+                db_ms=round(recorder.total_time * 1000, 2), queries=len(recorder.queries))))
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a view when the request carries "X-Profile: 1" (staff users, or
+    anyone with DEBUG on) or falls in the PROFILING_SAMPLE_RATE sample.
+    The written file's name comes back in the X-Profile response header.
+    Off, and out of the chain, unless PROFILING is set
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def requested(self, request):
+        if request.headers.get("X-Profile") != "1":
+            return False
+        user = getattr(request, "user", None)
+        return settings.DEBUG or bool(user and user.is_staff)
+
+    def __call__(self, request):
+        if not (self.requested(request) or profiling.should_sample()):
+            return self.get_response(request)
+        with profiling.profiled(f"{request.method} {request.path}") as result:
+            response = self.get_response(request)
+        response["X-Profile"] = result.path.name
+        return response
+
+
+def accepted_encodings(header):
+    """Content codings an Accept-Encoding header allows (q > 0)"""
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = params.strip().removeprefix("q=")
+        try:
+            allowed = float(quality) > 0 if quality else True
+        except ValueError:
+            allowed = True
+        if coding and allowed:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """
+    Answers STATIC_URL requests from the files collectstatic left in
+    STATIC_ROOT, indexed once at startup. Names from the manifest carry
+    their content hash and are cached for a year as immutable; anything else
+    for STATIC_MAX_AGE seconds. A .br or .gz variant is sent instead of the
+    file when the client accepts it. On when STATIC_SERVE is set (production
+    without a web server in front); runserver serves static files in DEBUG
+    """
+
+    IMMUTABLE = "public, max-age=31536000, immutable"
+
+    def __init__(self, get_response):
+        if not getattr(settings, "STATIC_SERVE", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = "/" + settings.STATIC_URL.lstrip("/")
+        self.max_age = getattr(settings, "STATIC_MAX_AGE", 60)
+        self.files = self.index(Path(settings.STATIC_ROOT))
+        self.immutable = set(getattr(staticfiles_storage, "hashed_files", {}).values())
+
+    def index(self, root):
+        """{relative name: path} for everything under root, variants included"""
+        if not root.is_dir():
+            return {}
+        return {path.relative_to(root).as_posix(): path for path in root.rglob("*") if path.is_file()}
+
+    def __call__(self, request):
+        if request.method not in ("GET", "HEAD") or not request.path.startswith(self.prefix):
+            return self.get_response(request)
+        name = request.path[len(self.prefix):]
+        path = self.files.get(name)
+        if path is None:
+            return self.get_response(request)
+
+        stat = path.stat()
+        if name not in self.immutable and not was_modified_since(
+                request.META.get("HTTP_IF_MODIFIED_SINCE"), stat.st_mtime):
+            return HttpResponseNotModified()
+
+        content_type, _ = mimetypes.guess_type(name)
+        accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        encoding = None
+        for coding, suffix in staticfiles.ENCODINGS:
+            if coding in accepted and name + suffix in self.files:
+                encoding, path = coding, self.files[name + suffix]
+                break
+
+        response = FileResponse(path.open("rb"), content_type=content_type or "application/octet-stream",
+                                filename=Path(name).name)
+        if encoding:
+            response["Content-Encoding"] = encoding
+        if any(name + suffix in self.files for _, suffix in staticfiles.ENCODINGS):
+            response["Vary"] = "Accept-Encoding"
+        response["Last-Modified"] = http_date(stat.st_mtime)
+        response["Cache-Control"] = self.IMMUTABLE if name in self.immutable else f"public, max-age={self.max_age}"
+        return response
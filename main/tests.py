@@ -1,3 +1,136 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import path
+from email.utils import formatdate
+from pathlib import Path
+from main.middleware import QueryInstrumentationMiddleware, StaticFilesMiddleware
+from shadow import staticfiles
+import gzip
+import json
+import shutil
+import tempfile
 
-# Create your tests here.
+
+def repeated_lookups(request):
+    # The same SQL three times, as an N+1 loop would run it
+    for pk in (1, 2, 3):
+        User.objects.filter(pk=pk).first()
+    return HttpResponse("ok")
+
+
+urlpatterns = [path("repeated", repeated_lookups)]
+
+
+@override_settings(ROOT_URLCONF=__name__, SQL_INSTRUMENTATION=True, SQL_REPEAT_THRESHOLD=2,
+                   SQL_SLOW_REQUEST_MS=60_000, SQL_SLOW_QUERY_MS=60_000)
+class QueryInstrumentationTests(TestCase):
+    def test_server_timing_and_repeated_queries(self):
+        with self.assertLogs("shadow.sql", "WARNING") as logs:
+            response = self.client.get("/repeated")
+        self.assertEqual(response.status_code, 200)
+        db, app, total = response["Server-Timing"].split(", ")
+        self.assertRegex(db, r'^db;dur=[\d.]+;desc="3 queries"$')
+        self.assertRegex(app, r"^app;dur=[\d.]+$")
+        self.assertRegex(total, r"^total;dur=[\d.]+$")
+
+        [event] = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertEqual(event["event"], "repeated_queries")
+        self.assertEqual((event["method"], event["path"], event["status"], event["queries"]),
+                         ("GET", "/repeated", 200, 3))
+        [group] = event["repeated"]
+        self.assertEqual(group["count"], 3)
+        self.assertIn('FROM "auth_user"', group["sql"])
+
+    @override_settings(SQL_SLOW_QUERY_MS=0)
+    def test_slow_queries_are_logged_one_by_one(self):
+        with self.assertLogs("shadow.sql", "WARNING") as logs:
+            self.client.get("/repeated")
+        events = [json.loads(record.getMessage())["event"] for record in logs.records]
+        self.assertEqual(events, ["slow_query"] * 3 + ["repeated_queries"])
+
+    @override_settings(SQL_INSTRUMENTATION=False)
+    def test_off_removes_itself(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryInstrumentationMiddleware(lambda request: HttpResponse())
+        with self.assertNoLogs("shadow.sql"):
+            response = self.client.get("/repeated")
+        self.assertNotIn("Server-Timing", response)
+
+
+class StaticFilesTests(TestCase):
+    """collectstatic with the production storage into a temporary STATIC_ROOT, served by the middleware"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = Path(tempfile.mkdtemp())
+        cls.addClassCleanup(shutil.rmtree, cls.root)
+        settings = override_settings(
+            STATIC_ROOT=cls.root,
+            STATIC_SERVE=True,
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "staticfiles": {"BACKEND": "shadow.staticfiles.CompressedManifestStaticFilesStorage"},
+            },
+        )
+        settings.enable()
+        cls.addClassCleanup(settings.disable)
+        call_command("collectstatic", interactive=False, verbosity=0)
+        cls.hashed = staticfiles_storage.stored_name("styles/finance.css")
+
+    def get(self, name, **headers):
+        return self.client.get(f"/static/{name}", headers=headers)
+
+    def test_storage_writes_compressed_copies_of_text_assets_only(self):
+        self.assertNotEqual(self.hashed, "styles/finance.css")
+        original = (self.root / self.hashed).read_bytes()
+        self.assertEqual(gzip.decompress((self.root / f"{self.hashed}.gz").read_bytes()), original)
+        self.assertEqual((self.root / f"{self.hashed}.br").exists(), staticfiles.brotli is not None)
+        image = staticfiles_storage.stored_name("images/404-doodle.png")
+        self.assertTrue((self.root / image).exists())
+        self.assertFalse((self.root / f"{image}.gz").exists())
+
+    def test_hashed_names_are_immutable(self):
+        response = self.get(self.hashed)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], StaticFilesMiddleware.IMMUTABLE)
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertEqual(b"".join(response.streaming_content), (self.root / self.hashed).read_bytes())
+
+        # Never revalidated: a hashed name's content can't change
+        response = self.get(self.hashed, if_modified_since=response["Last-Modified"])
+        self.assertEqual(response.status_code, 200)
+
+    def test_encoding_follows_accept_encoding(self):
+        # A stand-in .br when brotli isn't installed; the index is built per client
+        shopping = staticfiles_storage.stored_name("styles/shopping.css")
+        if not (self.root / f"{shopping}.br").exists():
+            (self.root / f"{shopping}.br").write_bytes(b"brotli stand-in")
+
+        for name, accept, encoding in ((self.hashed, "gzip, deflate", "gzip"),
+                                       (self.hashed, "gzip;q=0, deflate", None),
+                                       (self.hashed, "", None),
+                                       (shopping, "gzip, br", "br"),
+                                       (shopping, "br;q=0, gzip", "gzip")):
+            with self.subTest(name=name, accept=accept):
+                response = self.get(name, accept_encoding=accept)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.get("Content-Encoding"), encoding)
+                self.assertEqual(response["Vary"], "Accept-Encoding")
+                suffix = {"br": ".br", "gzip": ".gz", None: ""}[encoding]
+                self.assertEqual(b"".join(response.streaming_content), (self.root / f"{name}{suffix}").read_bytes())
+
+    def test_unhashed_names_are_revalidated(self):
+        response = self.get("styles/finance.css")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "public, max-age=60")
+
+        response = self.get("styles/finance.css", if_modified_since=response["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+        mtime = (self.root / "styles/finance.css").stat().st_mtime
+        response = self.get("styles/finance.css", if_modified_since=formatdate(mtime - 60, usegmt=True))
+        self.assertEqual(response.status_code, 200)
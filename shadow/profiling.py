@@ -0,0 +1,128 @@
+"""
+Low-overhead profiling for views and background workers.
+
+The default "collapsed" format samples the profiled thread's stack from a
+helper thread every PROFILING_INTERVAL_MS (via sys._current_frames()) and
+writes one "frame;frame;frame count" line per distinct stack, the input
+flame graph tools expect. "pstats" runs cProfile instead, which is exact but
+slows the profiled code down noticeably.
+Files go to PROFILING_DIR; manage.py profile_report summarizes them
+"""
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+from pathlib import Path
+import cProfile
+import random
+import re
+import sys
+import threading
+import time
+
+FORMATS = ("collapsed", "pstats")
+
+
+class StackSampler:
+    """Counts the stacks one thread is running, sampled from a helper thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self.collapse(frame)] += 1
+
+    def label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def collapse(self, frame):
+        labels = []
+        while frame is not None:
+            labels.append(self.label(frame.f_code))
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+
+def short_path(filename):
+    """Drop everything up to site-packages or the project root"""
+    marker = filename.rfind("site-packages/")
+    if marker != -1:
+        return filename[marker + len("site-packages/"):]
+    root = str(settings.BASE_DIR) + "/"
+    return filename[len(root):] if filename.startswith(root) else filename
+
+
+def profile_path(label, fmt):
+    directory = Path(getattr(settings, "PROFILING_DIR", settings.BASE_DIR / "profiles"))
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", label).strip("-")[:60] or "root"
+    suffix = "collapsed" if fmt == "collapsed" else "prof"
+    return directory / f"{time.strftime('%Y%m%d-%H%M%S')}-{time.perf_counter_ns() % 10**6:06d}-{slug}.{suffix}"
+
+
+class Profile:
+    """Result of profiled(): `path` is set once the block has finished"""
+    path = None
+
+
+@contextmanager
+def profiled(label, fmt=None):
+    """Profile the block on the current thread and write it to PROFILING_DIR"""
+    fmt = fmt or getattr(settings, "PROFILING_FORMAT", "collapsed")
+    result = Profile()
+    if fmt == "pstats":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            result.path = profile_path(label, fmt)
+            profiler.dump_stats(result.path)
+        return
+
+    interval = getattr(settings, "PROFILING_INTERVAL_MS", 2) / 1000
+    sampler = StackSampler(threading.get_ident(), interval)
+    sampler.start()
+    try:
+        yield result
+    finally:
+        sampler.stop()
+        result.path = profile_path(label, fmt)
+        result.path.write_text("".join(f"{stack} {count}\n" for stack, count in sampler.stacks.items()))
+
+
+def should_sample():
+    """True for a random PROFILING_SAMPLE_RATE share of calls while profiling is on"""
+    if not getattr(settings, "PROFILING", False):
+        return False
+    rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0)
+    return rate > 0 and random.random() < rate
+
+
+@contextmanager
+def sampled(label):
+    """profiled() for a sampled share of calls, a no-op otherwise. For background work"""
+    if should_sample():
+        with profiled(label) as result:
+            yield result
+    else:
+        yield None
@@ -0,0 +1,27 @@
+"""
+Database routing for the production profile: reads go to the 'read'
+connection so they don't queue behind the writer, everything else to
+'default'
+"""
+from django.db import connections
+
+
+class ReadWriteRouter:
+    read_alias = 'read'
+
+    def db_for_read(self, model, **hints):
+        # Inside a transaction on default, read there too so the block sees
+        # its own uncommitted writes
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return self.read_alias
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database file
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
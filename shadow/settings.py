@@ -11,11 +11,15 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+# 'production' switches on the tuned database profile below
+SHADOW_ENV = os.environ.get('SHADOW_ENV', 'development')
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -23,9 +27,11 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-a!vykwrn64h6i0$18@@9a+(gkig#wiy1cy0&c2kt2*i(g8_d05'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# SHADOW_DEBUG=1/0 overrides the default of on outside production
+DEBUG = os.environ.get('SHADOW_DEBUG', '0' if SHADOW_ENV == 'production' else '1') == '1'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.environ.get(
+    'SHADOW_ALLOWED_HOSTS', '' if DEBUG else 'localhost,127.0.0.1').split(',') if host]
 
 
 # Application definition
@@ -42,11 +48,23 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Static files answer before anything else runs; inactive unless STATIC_SERVE
+    'main.middleware.StaticFilesMiddleware',
+    # So it sees every query of the request; inactive unless SQL_INSTRUMENTATION
+    'main.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Compresses what everything below produces, ETags and 304s included
+    'django.middleware.gzip.GZipMiddleware',
+    # ETag from the content for pages without their own, and 304 on a match
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # request.finance_profile, loaded lazily and shared for the request
+    'widgets.middleware.FinanceProfileMiddleware',
+    # After auth, to allow X-Profile for staff; inactive unless PROFILING
+    'main.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -68,6 +86,18 @@ TEMPLATES = [
     },
 ]
 
+if SHADOW_ENV == 'production':
+    # Templates are read and compiled once per process. Django already
+    # wraps the default loaders like this; spelled out so production does
+    # not depend on that default
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'shadow.wsgi.application'
 
 
@@ -77,10 +107,58 @@ WSGI_APPLICATION = 'shadow.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SHADOW_DB_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+if SHADOW_ENV == 'production':
+    # WAL lets dashboard reads run alongside ledger writes. Writers start
+    # with BEGIN IMMEDIATE and wait up to `timeout` seconds for the lock
+    # instead of failing with "database is locked", and connections are
+    # kept open between requests
+    SQLITE_PRAGMAS = (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA temp_store=MEMORY;'
+        'PRAGMA cache_size=-20000;'
+        'PRAGMA mmap_size=134217728;'
+    )
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': SQLITE_PRAGMAS,
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    })
+    # Second connection to the same file for reads outside transactions,
+    # see shadow/routers.py
+    DATABASES['read'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATABASES['default']['NAME'],
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': SQLITE_PRAGMAS + 'PRAGMA query_only=ON;',
+            'timeout': 20,
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['shadow.routers.ReadWriteRouter']
+
+
+# ProfileModelBackend loads the logged-in user and their FinanceProfile in
+# one query. ModelBackend stays listed so sessions that name it keep
+# loading; those users switch over at their next login
+AUTHENTICATION_BACKENDS = [
+    'widgets.backends.ProfileModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Sessions are read from the cache and written through to the database, so
+# a request with a cached session costs no session query
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -117,6 +195,102 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = Path(os.environ.get('SHADOW_STATIC_ROOT', BASE_DIR / 'staticfiles'))
+
+# In production collectstatic writes content-hashed names (styles/finance.
+# 3f2a9c1b7d4e.css) with .gz/.br copies next to them, and {% static %} links
+# the hashed name. StaticFilesMiddleware serves STATIC_ROOT when no web server
+# does: hashed files as immutable for a year, so repeat page loads make no
+# static requests, the rest for STATIC_MAX_AGE seconds.
+# Run `manage.py collectstatic` on every deploy
+STATIC_SERVE = os.environ.get('SHADOW_STATIC_SERVE', '1' if SHADOW_ENV == 'production' else '0') == '1'
+STATIC_MAX_AGE = 60
+if SHADOW_ENV == 'production':
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'shadow.staticfiles.CompressedManifestStaticFilesStorage'},
+    }
+
+# Cache for per-user dashboard and shopping list fragments (widgets/cache.py)
+# and computed scores. SHADOW_CACHE=file shares it between worker processes;
+# the default in-memory cache is per process. Both evict past MAX_ENTRIES
+CACHE_BACKEND = os.environ.get('SHADOW_CACHE', 'file' if SHADOW_ENV == 'production' else 'locmem')
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('SHADOW_CACHE_DIR', BASE_DIR / '.cache'),
+            'OPTIONS': {'MAX_ENTRIES': 5000, 'CULL_FREQUENCY': 4},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'shadow',
+            'OPTIONS': {'MAX_ENTRIES': 5000, 'CULL_FREQUENCY': 4},
+        }
+    }
+# Seconds a cached fragment is kept; changes expire it earlier
+USER_CACHE_TIMEOUT = 3600
+# Release name (e.g. the git commit) that page ETags and fragment keys are
+# tied to, together with the static manifest and the templates. Set it on
+# deploys that only change Python code behind the pages
+RELEASE = os.environ.get('SHADOW_RELEASE', '')
+
+# Per-request SQL timing and N+1 detection (main/middleware.py). Adds a
+# Server-Timing header and logs slow requests, slow queries and SQL repeated
+# SQL_REPEAT_THRESHOLD times in one request to SQL_LOG_FILE as JSON lines
+SQL_INSTRUMENTATION = os.environ.get('SHADOW_SQL_INSTRUMENTATION') == '1'
+SQL_SLOW_REQUEST_MS = 500
+SQL_SLOW_QUERY_MS = 100
+SQL_REPEAT_THRESHOLD = 5
+SQL_LOG_FILE = os.environ.get('SHADOW_SQL_LOG', BASE_DIR / 'sql.log')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'sql_file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SQL_LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'formatter': 'message',
+            # The file is only created once something is logged
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'shadow.sql': {'handlers': ['sql_file'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Profiler for views and price workers (shadow/profiling.py), off unless
+# SHADOW_PROFILING=1. Then requests sending "X-Profile: 1" (staff, or anyone
+# with DEBUG) and a random PROFILING_SAMPLE_RATE share of requests and price
+# lookups are profiled into PROFILING_DIR. Format 'collapsed' samples stacks
+# every PROFILING_INTERVAL_MS; 'pstats' runs cProfile.
+# `manage.py profile_report` summarizes the files
+PROFILING = os.environ.get('SHADOW_PROFILING') == '1'
+PROFILING_SAMPLE_RATE = float(os.environ.get('SHADOW_PROFILING_RATE', 0))
+PROFILING_FORMAT = os.environ.get('SHADOW_PROFILING_FORMAT', 'collapsed')
+PROFILING_INTERVAL_MS = 2
+PROFILING_DIR = os.environ.get('SHADOW_PROFILING_DIR', BASE_DIR / 'profiles')
+
+# Background workers resolving shopping list prices from item links
+PRICE_FETCH_WORKERS = 4
+
+# Price scraper: seconds per request, cached price lifetime and size, and how
+# many failures trip a retailer's circuit breaker (and for how long)
+SCRAPER_TIMEOUT = 10
+PRICE_CACHE_TTL = 3600
+PRICE_CACHE_SIZE = 1024
+SCRAPER_FAILURE_THRESHOLD = 3
+SCRAPER_RESET_TIMEOUT = 300
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -0,0 +1,53 @@
+"""
+collectstatic storage writing content-hashed names plus precompressed copies.
+
+Every hashed text asset (CSS, JS, SVG, ...) gets a .gz sibling, and a .br
+one when the optional brotli package is installed. A copy is kept only when
+it saves at least 5%. Already compressed formats such as PNG are left
+alone. main.middleware.StaticFilesMiddleware serves the result
+"""
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = (".css", ".js", ".map", ".svg", ".json", ".txt", ".html", ".xml", ".ico")
+# (encoding, file suffix) in order of preference when a client accepts both
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    # mtime=0 keeps the output identical between runs
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def available_encodings():
+    return [(encoding, suffix) for encoding, suffix in ENCODINGS if encoding != "br" or brotli is not None]
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        # hashed_files now maps every name to its final hashed name; CSS
+        # passes leave intermediate names behind that nothing links to
+        for hashed_name in sorted(set(self.hashed_files.values())):
+            if not hashed_name.lower().endswith(COMPRESSIBLE):
+                continue
+            with self.open(hashed_name) as original:
+                data = original.read()
+            for encoding, suffix in available_encodings():
+                compressed = compress(data, encoding)
+                if len(compressed) < len(data) * 0.95:
+                    if self.exists(hashed_name + suffix):
+                        self.delete(hashed_name + suffix)
+                    self._save(hashed_name + suffix, ContentFile(compressed))
+                    yield hashed_name, hashed_name + suffix, True
@@ -1,9 +1,23 @@
 from django.contrib import admin
-from .models import ShoppingListItem, finance, FinanceProfile, Transaction
+from .models import ShoppingListItem, finance, FinanceProfile, Transaction, DomainStrategy
+from . import search
+
+
+class IndexedSearchMixin:
+    """Admin search through the full-text index (widgets/search.py) instead of LIKE '%term%' scans"""
+    search_index = None
+
+    def get_search_results(self, request, queryset, search_term):
+        ids = search.matching_ids(self.search_index, search_term)
+        if ids is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=ids), False
 
 @admin.register(ShoppingListItem)
-class ShoppingListItemAdmin(admin.ModelAdmin):
+class ShoppingListItemAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ('user', 'name', 'link', 'price', 'priority') 
+    search_fields = ('name',)
+    search_index = 'items'
 
 @admin.register(finance)
 class FinanceAdmin(admin.ModelAdmin):
@@ -12,13 +26,27 @@ class FinanceAdmin(admin.ModelAdmin):
 @admin.register(FinanceProfile)
 class FinanceProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'total_funds', 'monthly_income', 'financial_score', 'updated_at')
+    list_select_related = ('user',)
     readonly_fields = ('financial_score', 'budget_allocation')
     list_filter = ('created_at', 'updated_at')
 
+    def get_queryset(self, request):
+        # Score every row of the changelist from the same query
+        return super().get_queryset(request).with_score_totals()
+
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ('finance_profile', 'amount', 'transaction_type', 'category', 'description', 'created_at')
     list_filter = ('transaction_type', 'category', 'created_at')
     search_fields = ('description',)
+    search_index = 'transactions'
+
+@admin.register(DomainStrategy)
+class DomainStrategyAdmin(admin.ModelAdmin):
+    list_display = ('domain', 'strategy', 'locator', 'hits', 'misses', 'hit_rate', 'updated_at')
+    list_filter = ('strategy',)
+    search_fields = ('domain',)
+    ordering = ('-hits',)
+
 class FinanceWidget(admin.ModelAdmin):
     list_display = ("user","funds")
@@ -0,0 +1,115 @@
+"""
+Spending analytics for the finance page: daily series, rolling averages per
+category, burn rate and a month-end projection against the budget allocation.
+
+The inputs are the profile's DailySpend buckets, fetched as columns in one
+values_list() query and folded into NumPy arrays. There are at most a few
+buckets per day, so the cost follows the length of the window rather than
+the number of transactions behind it
+"""
+from django.utils import timezone
+from .models import Transaction
+import calendar
+import datetime
+import numpy as np
+
+CATEGORIES = [category for category, label in Transaction.CATEGORIES]
+# What each category is measured by against its budget: spending for needs
+# and wants, money put away for savings (as in FinanceSnapshot)
+TRACKED_TYPE = {'needs': 'debit', 'wants': 'debit', 'savings': 'credit'}
+
+WINDOW_DAYS = 90
+ROLLING_DAYS = 7
+BURN_DAYS = 30
+
+
+def daily_series(profile, start, end):
+    """
+    Per-day totals from start to end (inclusive) as a float array shaped
+    (2, categories, days); index 0 holds debits, 1 credits
+    """
+    series = np.zeros((2, len(CATEGORIES), (end - start).days + 1))
+    rows = list(profile.daily_spend.filter(day__gte=start, day__lte=end).order_by().values_list(
+        'day', 'category', 'transaction_type', 'total'
+    ))
+    if not rows:
+        return series
+
+    days, categories, types, totals = (np.array(column) for column in zip(*rows))
+    offsets = (days.astype('datetime64[D]') - np.datetime64(start, 'D')).astype(int)
+    kinds = (types == 'credit').astype(int)
+    # Unknown categories map past the end and are dropped
+    indexes = np.select([categories == category for category in CATEGORIES], range(len(CATEGORIES)),
+                        len(CATEGORIES))
+    known = indexes < len(CATEGORIES)
+    np.add.at(series, (kinds[known], indexes[known], offsets[known]), totals[known].astype(float))
+    return series
+
+
+def rolling_mean(series, window):
+    """Trailing mean over the last axis; the first days average what they have"""
+    cumulative = np.cumsum(series, axis=-1)
+    sums = cumulative.copy()
+    sums[..., window:] -= cumulative[..., :-window]
+    return sums / np.minimum(np.arange(1, series.shape[-1] + 1), window)
+
+
+def spending_analytics(profile, today=None):
+    """
+    JSON-ready analytics for the WINDOW_DAYS up to today. Amounts are per
+    day unless named otherwise; runway_days is how long total_funds lasts
+    at the current burn rate (None while nothing is being spent)
+    """
+    today = today or timezone.localdate()
+    month_start = today.replace(day=1)
+    start = min(month_start, today - datetime.timedelta(days=WINDOW_DAYS - 1))
+    series = daily_series(profile, start, today)
+    debits, credits = series
+
+    # Trailing daily averages; burn rate is spending only
+    rolling = rolling_mean(debits, ROLLING_DAYS)
+    rates = series[:, :, -BURN_DAYS:].mean(axis=-1)
+    burn = rates[0].sum()
+
+    # Month to date plus the recent daily rate over the days left
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    remaining = days_in_month - today.day
+    tracked = np.array([0 if TRACKED_TYPE[category] == 'debit' else 1 for category in CATEGORIES])
+    category_rows = np.arange(len(CATEGORIES))
+    month_to_date = series[:, :, (month_start - start).days:].sum(axis=-1)[tracked, category_rows]
+    projected = month_to_date + rates[tracked, category_rows] * remaining
+
+    allocation = profile.budget_allocation
+    budget = np.array([allocation.get(category, 0) for category in CATEGORIES], dtype=float)
+    is_savings = tracked == 1
+    # Spending should stay under its budget, savings should reach theirs
+    on_track = np.where(is_savings, projected >= budget, projected <= budget)
+
+    def rounded(values):
+        return np.round(values, 2).tolist()
+
+    return {
+        'start': start.isoformat(),
+        'end': today.isoformat(),
+        'days': np.arange(np.datetime64(start, 'D'), np.datetime64(today, 'D') + 1).astype(str).tolist(),
+        'daily': dict(zip(CATEGORIES, rounded(debits)), income=rounded(credits.sum(axis=0))),
+        'rolling': {'window_days': ROLLING_DAYS, **dict(zip(CATEGORIES, rounded(rolling)))},
+        'burn_rate': {'window_days': BURN_DAYS, 'total': round(float(burn), 2),
+                      **dict(zip(CATEGORIES, rounded(rates[0])))},
+        'runway_days': max(0, int(float(profile.total_funds) // burn)) if burn > 0 else None,
+        'month': {
+            'days_elapsed': today.day,
+            'days_remaining': remaining,
+            'categories': {
+                category: {
+                    'type': TRACKED_TYPE[category],
+                    'month_to_date': round(float(month_to_date[n]), 2),
+                    'projected': round(float(projected[n]), 2),
+                    'budget': round(float(budget[n]), 2),
+                    'on_track': bool(on_track[n]) if budget[n] else None,
+                } for n, category in enumerate(CATEGORIES)
+            },
+            'projected_spend': round(float(projected[~is_savings].sum()), 2),
+            'spending_budget': round(float(budget[~is_savings].sum()), 2),
+        },
+    }
@@ -0,0 +1,14 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class ProfileModelBackend(ModelBackend):
+    """
+    ModelBackend that loads the session's user together with their
+    FinanceProfile (a LEFT JOIN, so users without one still load), leaving
+    FinanceProfile.for_user() nothing to fetch
+    """
+
+    def get_user(self, user_id):
+        user = get_user_model()._default_manager.select_related('finance_profile').filter(pk=user_id).first()
+        return user if user is not None and self.user_can_authenticate(user) else None
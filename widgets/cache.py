@@ -0,0 +1,123 @@
+"""
+Per-user cache for computed pages and fragments.
+
+Each user has a version number that is replaced whenever one of their
+transactions, shopping items or their finance profile changes (see
+signals.py, and invalidate_user() calls where .update()/bulk_create skip
+the signals). A fragment is stored next to the version and day it was built
+for, so an unchanged page costs a single get_many
+"""
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.middleware.csrf import get_token
+from django.template import engines
+from django.template.utils import get_app_template_dirs
+from django.utils import timezone
+from pathlib import Path
+import functools
+import hashlib
+import time
+
+
+@functools.lru_cache(maxsize=None)
+def build_id():
+    """
+    Short hash of the deployed build: settings.RELEASE, the hashed static
+    names from the staticfiles manifest and the template sources. Part of
+    page ETags and fragment keys, so after a deploy no page is answered with
+    a 304 or served from a fragment built against the old templates/assets
+    """
+    digest = hashlib.sha1(getattr(settings, "RELEASE", "").encode())
+    for name, hashed in sorted(getattr(staticfiles_storage, "hashed_files", {}).items()):
+        digest.update(f"{name}={hashed};".encode())
+    directories = {Path(directory) for engine in engines.all() for directory in engine.dirs}
+    directories.update(Path(directory) for directory in get_app_template_dirs("templates"))
+    for directory in sorted(directories):
+        for path in sorted(directory.rglob("*")):
+            if path.is_file():
+                digest.update(path.as_posix().encode())
+                digest.update(path.read_bytes())
+    return digest.hexdigest()[:10]
+
+
+@receiver(setting_changed)
+def reset_build_id(setting, **kwargs):
+    if setting in ("RELEASE", "STATIC_ROOT", "STORAGES", "TEMPLATES", "INSTALLED_APPS"):
+        build_id.cache_clear()
+
+
+def version_key(user_id):
+    return f"user-version:{user_id}"
+
+
+def bump_user_version(user_id):
+    # A fresh timestamp rather than incr(): no read, works on every backend,
+    # and never reuses a version after the key was evicted
+    cache.set(version_key(user_id), time.time_ns(), None)
+
+
+def invalidate_user(user_id):
+    """Expire the user's cached fragments once the current DB transaction commits"""
+    if user_id is not None:
+        transaction.on_commit(lambda: bump_user_version(user_id))
+
+
+def current_version(user_id, known=None):
+    """The user's version, starting one if the key is missing or was evicted"""
+    version = known if known is not None else cache.get(version_key(user_id))
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(version_key(user_id), version, None):
+            version = cache.get(version_key(user_id), version)
+    return version
+
+
+def user_etag(request):
+    """Strong ETag for a user's data as of today, for @condition(etag_func=...)"""
+    if not request.user.is_authenticated:
+        return None
+    return f"{request.user.pk}-{current_version(request.user.pk)}-{timezone.localdate().isoformat()}"
+
+
+def page_etag(request):
+    """
+    ETag for a user's HTML page: user_etag() plus the build it was rendered
+    by and the CSRF secret its forms were rendered with
+    """
+    etag = user_etag(request)
+    return f"{etag}-{build_id()}-{csrf_variant(request)}" if etag else None
+
+
+def cached_for_user(user_id, name, build, variant=""):
+    """
+    Return build() for this user, reusing the cached value while the user's
+    version and the current day are unchanged. `variant` separates copies
+    that differ for reasons outside the data (e.g. the CSRF secret); each
+    build has its own keys, so a deploy starts from empty fragments
+    """
+    key = f"user-fragment:{user_id}:{name}:{build_id()}:{variant}"
+    found = cache.get_many([version_key(user_id), key])
+    version = current_version(user_id, found.get(version_key(user_id)))
+
+    # The day is part of the stamp: budgets and spending cover the last 30 days
+    stamp = (version, timezone.localdate().isoformat())
+    entry = found.get(key)
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+
+    value = build()
+    cache.set(key, (stamp, value), getattr(settings, "USER_CACHE_TIMEOUT", 3600))
+    return value
+
+
+def csrf_variant(request):
+    """Short hash of the request's CSRF secret, for fragments containing forms"""
+    # get_token() makes sure there is a secret (and that its cookie is sent);
+    # any token rendered from the same secret stays valid
+    get_token(request)
+    secret = request.META.get("CSRF_COOKIE", "")
+    return hashlib.sha1(secret.encode()).hexdigest()[:12]
@@ -0,0 +1,94 @@
+from django.db.models import Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import SCORE_TOTALS, Transaction, score_from_totals
+from .operations import annotate_affordability, get_shopping_list
+import base64
+import binascii
+import datetime
+
+
+class FinanceSnapshot:
+    """
+    Everything the finance dashboard and the smart tips read, loaded with one
+    conditional aggregate over the daily buckets plus one shopping list query
+    """
+
+    def __init__(self, profile, days=30):
+        self.profile = profile
+        self.total_funds = profile.total_funds
+        self.monthly_income = profile.monthly_income
+        self.budget_allocation = profile.budget_allocation
+
+        since = (timezone.now() - datetime.timedelta(days=days)).date()
+        totals = profile.daily_spend.aggregate(
+            needs_spent=Sum('total', filter=Q(day__gte=since, category='needs', transaction_type='debit')),
+            wants_spent=Sum('total', filter=Q(day__gte=since, category='wants', transaction_type='debit')),
+            savings_amount=Sum('total', filter=Q(day__gte=since, category='savings', transaction_type='credit')),
+            **SCORE_TOTALS
+        )
+
+        # Last `days` days
+        self.needs_spent = totals['needs_spent'] or 0
+        self.wants_spent = totals['wants_spent'] or 0
+        self.savings_amount = totals['savings_amount'] or 0
+
+        # All time
+        self.transaction_count = totals['count'] or 0
+        self.total_savings = totals['savings'] or 0
+        self.financial_score = score_from_totals(totals['needs'], totals['wants'], totals['savings'],
+                                                 self.monthly_income, self.transaction_count)
+
+        self.shopping_items = annotate_affordability(
+            get_shopping_list(profile.user_id), profile,
+            spent={'needs': self.needs_spent, 'wants': self.wants_spent},
+        )
+        # Pending items hold a placeholder price of 0 until their fetch finishes
+        priced = [item for item in self.shopping_items if not item.price_pending]
+        self.affordable_items = [item for item in priced if item.can_afford]
+        # Items the balance covers, ignoring the category budgets
+        self.items_within_funds = [item for item in priced if self.total_funds >= item.price]
+
+
+def encode_cursor(transaction):
+    raw = f"{transaction.created_at.isoformat()}|{transaction.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor, raises ValueError for anything malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split("|")
+        # parse_datetime raises ValueError for well-formed but impossible
+        # dates and returns None for anything else
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (TypeError, ValueError, binascii.Error):
+        # UnicodeDecodeError included, it's a ValueError
+        raise ValueError("invalid cursor") from None
+    if created_at is None:
+        raise ValueError("invalid cursor")
+    return created_at, pk
+
+
+def transaction_page(profile, cursor=None, category=None, transaction_type=None, size=20):
+    """
+    One page of a profile's transactions, newest first, continuing after
+    `cursor`. Paging seeks on (created_at, id) instead of using OFFSET, so
+    every page is an index range scan of `size` rows.
+    Returns (transactions, next_cursor); next_cursor is None on the last page
+    """
+    transactions = Transaction.objects.filter(finance_profile=profile)
+    if category:
+        transactions = transactions.filter(category=category)
+    if transaction_type:
+        transactions = transactions.filter(transaction_type=transaction_type)
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        # (created_at, id) < cursor, written so created_at stays a range bound
+        transactions = transactions.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=pk)
+
+    page = list(transactions.order_by('-created_at', '-id')[:size + 1])
+    next_cursor = encode_cursor(page[size - 1]) if len(page) > size else None
+    return page[:size], next_cursor
@@ -0,0 +1,86 @@
+"""
+Balance changes for the Transaction ledger.
+Every write adjusts FinanceProfile.total_funds with a single F() update,
+so concurrent requests can't overwrite each other's balance, and starts
+its atomic block with that write so SQLite takes the write lock up front
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import FinanceProfile, Transaction, ShoppingListItem
+
+
+class InsufficientFunds(Exception):
+    """A debit would take the balance below zero"""
+
+    def __init__(self, amount, balance):
+        self.amount = amount
+        self.balance = balance
+        self.shortage = amount - balance
+        super().__init__(f"need ₹{self.shortage:.2f} more, balance is ₹{balance}")
+
+
+def adjust_balance(profile_id, delta, require_funds=False):
+    """
+    Add delta to the profile's balance in one UPDATE. With require_funds the
+    update only matches while the balance covers the debit, otherwise
+    InsufficientFunds is raised and nothing changes
+    """
+    balance = FinanceProfile.objects.filter(pk=profile_id)
+    if require_funds and delta < 0:
+        balance = balance.filter(total_funds__gte=-delta)
+    if not balance.update(total_funds=F("total_funds") + delta, updated_at=timezone.now()):
+        current = FinanceProfile.objects.filter(pk=profile_id).values_list("total_funds", flat=True).first()
+        if current is None:
+            raise FinanceProfile.DoesNotExist("finance profile not found")
+        raise InsufficientFunds(-delta, current)
+
+
+def signed_amount(amount, transaction_type):
+    return amount if transaction_type == "credit" else -amount
+
+
+def post_transaction(profile, amount, transaction_type, category, description, allow_overdraft=False):
+    """
+    Record a transaction and apply it to the balance.
+    Debits raise InsufficientFunds unless allow_overdraft is set
+    """
+    with transaction.atomic():
+        adjust_balance(profile.pk, signed_amount(amount, transaction_type), require_funds=not allow_overdraft)
+        return Transaction.objects.create(
+            finance_profile=profile,
+            amount=amount,
+            transaction_type=transaction_type,
+            category=category,
+            description=description,
+        )
+
+
+def reverse_transaction(txn):
+    """
+    Delete a transaction and undo its effect on the balance.
+    Raises Transaction.DoesNotExist if it was already removed
+    """
+    with transaction.atomic():
+        adjust_balance(txn.finance_profile_id, -signed_amount(txn.amount, txn.transaction_type))
+        # Through a queryset: Model.delete() sends post_delete, and so takes
+        # the row out of its daily bucket, even when the row was already gone
+        deleted, _ = Transaction.objects.filter(pk=txn.pk).delete()
+        if not deleted:
+            # Removed by a concurrent request: roll the balance change back
+            raise Transaction.DoesNotExist("transaction already removed")
+
+
+def purchase_item(profile, item):
+    """
+    Pay for a shopping list item and take it off the list.
+    Raises InsufficientFunds, or ShoppingListItem.DoesNotExist if the item
+    was already bought
+    """
+    category = "needs" if item.priority else "wants"
+    with transaction.atomic():
+        txn = post_transaction(profile, item.price, "debit", category, f"Purchased: {item.name}")
+        _, deleted = item.delete()
+        if not deleted.get(ShoppingListItem._meta.label):
+            raise ShoppingListItem.DoesNotExist("item already bought")
+    return txn
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from widgets.operations import parse_shopping_file, import_shopping_items, resolve_prices
+import csv
+import time
+
+
+class Command(BaseCommand):
+    help = "Bulk import a CSV, JSON or JSON lines shopping list for a user and resolve missing prices"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Concurrent price lookups (defaults to PRICE_FETCH_WORKERS)")
+        parser.add_argument('--no-fetch', action='store_true',
+                            help="Leave missing prices pending instead of fetching them now")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']}")
+
+        started = time.monotonic()
+        try:
+            with open(options['path'], 'rb') as fileobj, transaction.atomic():
+                created, skipped, pending_ids = import_shopping_items(
+                    user, parse_shopping_file(fileobj, options['path']), chunk_size=options['chunk_size'])
+        except (ValueError, csv.Error) as e:
+            raise CommandError(f"Couldn't read {options['path']}: {e}")
+        self.stdout.write(f"Imported {created} items, skipped {skipped} rows "
+                          f"in {time.monotonic() - started:.2f}s")
+
+        if pending_ids and not options['no_fetch']:
+            started = time.monotonic()
+            resolve_prices(pending_ids, workers=options['workers'])
+            self.stdout.write(f"Looked up {len(pending_ids)} prices in {time.monotonic() - started:.2f}s")
+        self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from widgets.models import FinanceProfile
+from widgets.statements import import_statement
+import time
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV bank statement into a user's transaction ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--chunk-size', type=int, default=4000)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']}")
+        profile, created = FinanceProfile.objects.get_or_create(user=user)
+
+        started = time.monotonic()
+        with open(options['path'], 'rb') as fileobj:
+            try:
+                stats = import_statement(profile, fileobj, chunk_size=options['chunk_size'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        self.stdout.write(f"Imported {stats['imported']} transactions, {stats['duplicates']} duplicates, "
+                          f"{stats['skipped']} rows skipped in {time.monotonic() - started:.2f}s "
+                          f"(net change ₹{stats['net_change']})")
+        self.stdout.write(self.style.SUCCESS("Done"))
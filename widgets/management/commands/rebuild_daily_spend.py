@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from widgets.models import DailySpend, FinanceProfile
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailySpend rollup buckets from the Transaction table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users', default=[],
+                            help="Only rebuild buckets for this username (repeatable)")
+
+    def handle(self, *args, **options):
+        profiles = None
+        if options['users']:
+            profiles = FinanceProfile.objects.filter(user__username__in=options['users'])
+        DailySpend.rebuild(profiles)
+        buckets = DailySpend.objects.all()
+        if profiles is not None:
+            buckets = buckets.filter(finance_profile__in=profiles)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {buckets.count()} daily spend buckets"))
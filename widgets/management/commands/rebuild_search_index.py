@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from widgets import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from the ShoppingListItem and Transaction tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', dest='kinds', choices=list(search.INDEXES),
+                            help="Only rebuild this index (repeatable)")
+
+    def handle(self, *args, **options):
+        if not search.is_available(connection):
+            raise CommandError("The search index needs SQLite (FTS5)")
+        with transaction.atomic():
+            search.install(connection)
+            search.rebuild(connection, options['kinds'])
+        for kind in options['kinds'] or search.INDEXES:
+            rows = search.INDEXES[kind]['model'].objects.count()
+            self.stdout.write(self.style.SUCCESS(f"Indexed {rows} {kind}"))
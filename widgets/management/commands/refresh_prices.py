@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from widgets.models import ShoppingListItem
+from widgets.operations import refresh_prices
+import time
+
+
+class Command(BaseCommand):
+    help = "Re-check shopping list prices with conditional requests and record changes in the price history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users', default=[],
+                            help="Only refresh this username's items (repeatable)")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Concurrent requests (defaults to PRICE_FETCH_WORKERS)")
+
+    def handle(self, *args, **options):
+        items = ShoppingListItem.objects.exclude(link="").exclude(price_status='pending').exclude(manual_price=True)
+        if options['users']:
+            items = items.filter(user__username__in=options['users'])
+        item_ids = list(items.values_list('pk', flat=True))
+
+        started = time.monotonic()
+        changed = refresh_prices(item_ids, workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {len(item_ids)} items, {changed} prices changed ({time.monotonic() - started:.2f}s)"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from widgets.models import ShoppingListItem
+from widgets.operations import resolve_price
+
+
+class Command(BaseCommand):
+    help = "Fetch prices for shopping list items still waiting on the background worker (e.g. after a restart)"
+
+    def handle(self, *args, **options):
+        pending = list(ShoppingListItem.objects.filter(price_status='pending').values_list('pk', flat=True))
+        for item_id in pending:
+            resolve_price(item_id)
+        resolved = ShoppingListItem.objects.filter(pk__in=pending, price_status='ready').count()
+        self.stdout.write(self.style.SUCCESS(f"Resolved {resolved} of {len(pending)} pending prices"))
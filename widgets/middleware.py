@@ -0,0 +1,24 @@
+from django.utils.functional import SimpleLazyObject
+from .models import FinanceProfile
+
+
+def get_finance_profile(request):
+    if not request.user.is_authenticated:
+        return None
+    return FinanceProfile.for_user(request.user)
+
+
+class FinanceProfileMiddleware:
+    """
+    Adds request.finance_profile: the logged-in user's profile, created on
+    first use, loaded lazily and memoized on request.user so views, payload
+    builders and model helpers all share one object. Must come after
+    AuthenticationMiddleware
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.finance_profile = SimpleLazyObject(lambda: get_finance_profile(request))
+        return self.get_response(request)
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_spend(apps, schema_editor):
+    Transaction = apps.get_model('widgets', 'Transaction')
+    DailySpend = apps.get_model('widgets', 'DailySpend')
+    rows = Transaction.objects.order_by().annotate(day=TruncDate('created_at')).values(
+        'finance_profile_id', 'day', 'category', 'transaction_type'
+    ).annotate(sum=Sum('amount'), n=Count('id'))
+    DailySpend.objects.bulk_create(
+        [DailySpend(
+            finance_profile_id=row['finance_profile_id'],
+            day=row['day'],
+            category=row['category'],
+            transaction_type=row['transaction_type'],
+            total=row['sum'],
+            count=row['n'],
+        ) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('widgets', '0004_financeprofile_transaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySpend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(choices=[('needs', 'Needs'), ('wants', 'Wants'), ('savings', 'Savings')], max_length=10)),
+                ('transaction_type', models.CharField(choices=[('credit', 'Credit'), ('debit', 'Debit')], max_length=6)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('finance_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_spend', to='widgets.financeprofile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('finance_profile', 'day', 'category', 'transaction_type'), name='unique_daily_spend_bucket')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_spend, migrations.RunPython.noop),
+    ]
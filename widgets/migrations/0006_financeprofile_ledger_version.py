@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('widgets', '0005_dailyspend'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='financeprofile',
+            name='ledger_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
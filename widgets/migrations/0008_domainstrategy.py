@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('widgets', '0007_shoppinglistitem_price_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DomainStrategy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(max_length=255, unique=True)),
+                ('strategy', models.CharField(choices=[('jsonld', 'JSON-LD'), ('meta', 'Meta tag'), ('text', 'Text regex')], max_length=6)),
+                ('locator', models.CharField(blank=True, max_length=255)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('misses', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('widgets', '0009_price_history'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['finance_profile', 'created_at', 'id'], name='txn_profile_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['finance_profile', 'category', 'created_at', 'id'], name='txn_profile_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['finance_profile', 'transaction_type', 'created_at', 'id'], name='txn_profile_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['finance_profile', 'category', 'transaction_type', 'created_at'], name='txn_profile_cat_type_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('widgets', '0011_transaction_statement_import'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyspend',
+            index=models.Index(fields=['finance_profile', 'category', 'transaction_type', 'day', 'total'], name='daily_spend_window_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglistitem',
+            index=models.Index(fields=['user', '-priority', 'id'], name='shopping_user_priority_idx'),
+        ),
+    ]
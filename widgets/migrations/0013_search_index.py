@@ -0,0 +1,69 @@
+from django.db import migrations
+
+# The index as of this migration, spelled out rather than generated by
+# widgets/search.py, so later model changes can't alter what it creates.
+# search.install_triggers() recreates the triggers for the current schema
+# after every migrate
+
+CREATE_INDEX = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS widgets_shoppinglistitem_fts USING fts5("
+    "body, owner, prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS widgets_shoppinglistitem_fts_insert AFTER INSERT ON widgets_shoppinglistitem BEGIN "
+    "INSERT INTO widgets_shoppinglistitem_fts(rowid, body, owner) VALUES (new.id, new.name, 'u' || new.user_id); END",
+    "CREATE TRIGGER IF NOT EXISTS widgets_shoppinglistitem_fts_update "
+    "AFTER UPDATE OF name, user_id ON widgets_shoppinglistitem BEGIN "
+    "UPDATE widgets_shoppinglistitem_fts SET body = new.name, owner = 'u' || new.user_id WHERE rowid = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS widgets_shoppinglistitem_fts_delete AFTER DELETE ON widgets_shoppinglistitem BEGIN "
+    "DELETE FROM widgets_shoppinglistitem_fts WHERE rowid = old.id; END",
+    "INSERT INTO widgets_shoppinglistitem_fts(rowid, body, owner) "
+    "SELECT id, name, 'u' || user_id FROM widgets_shoppinglistitem",
+
+    "CREATE VIRTUAL TABLE IF NOT EXISTS widgets_transaction_fts USING fts5("
+    "body, owner, prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS widgets_transaction_fts_insert AFTER INSERT ON widgets_transaction BEGIN "
+    "INSERT INTO widgets_transaction_fts(rowid, body, owner) VALUES (new.id, new.description, "
+    "'u' || (SELECT user_id FROM widgets_financeprofile WHERE id = new.finance_profile_id)); END",
+    "CREATE TRIGGER IF NOT EXISTS widgets_transaction_fts_update "
+    "AFTER UPDATE OF description, finance_profile_id ON widgets_transaction BEGIN "
+    "UPDATE widgets_transaction_fts SET body = new.description, "
+    "owner = 'u' || (SELECT user_id FROM widgets_financeprofile WHERE id = new.finance_profile_id) "
+    "WHERE rowid = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS widgets_transaction_fts_delete AFTER DELETE ON widgets_transaction BEGIN "
+    "DELETE FROM widgets_transaction_fts WHERE rowid = old.id; END",
+    "INSERT INTO widgets_transaction_fts(rowid, body, owner) "
+    "SELECT id, description, 'u' || (SELECT user_id FROM widgets_financeprofile "
+    "WHERE id = widgets_transaction.finance_profile_id) FROM widgets_transaction",
+]
+
+DROP_INDEX = [
+    f"DROP TRIGGER IF EXISTS {table}_fts_{action}"
+    for table in ("widgets_shoppinglistitem", "widgets_transaction")
+    for action in ("insert", "update", "delete")
+] + [
+    "DROP TABLE IF EXISTS widgets_shoppinglistitem_fts",
+    "DROP TABLE IF EXISTS widgets_transaction_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite only; other backends search with icontains (widgets/search.py)
+    if schema_editor.connection.vendor == "sqlite":
+        for sql in CREATE_INDEX:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for sql in DROP_INDEX:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('widgets', '0012_query_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('widgets', '0014_shoppinglistitem_manual_price'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='finance_profile',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='widgets.financeprofile'),
+        ),
+    ]
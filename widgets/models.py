@@ -1,105 +1,185 @@
-from django.db import models
+from django.db import models, transaction as db_transaction
+from django.core.cache import cache
+from django.db.models import F, Q, Count, Sum
+from django.db.models.functions import TruncDate
 from django.contrib.auth.models import User
+from django.utils import timezone
 from decimal import Decimal
+from .cache import invalidate_user
+import datetime
 import json
 
+PRICE_STATUSES = [
+    ('ready', 'Ready'),
+    ('pending', 'Pending'),  # waiting for the background price fetch
+    ('failed', 'Failed'),  # the price couldn't be fetched automatically
+]
+
 class ShoppingListItem(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='shopping_list')
     name = models.CharField(max_length=255)
     link = models.URLField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     priority = models.BooleanField(default=False, verbose_name="Is Need?")
+    price_status = models.CharField(max_length=7, choices=PRICE_STATUSES, default='ready')
+    # Price before the last change seen by the refresh pass, for "price dropped" flags
+    previous_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Validators from the last fetch of the link, sent back on refresh
+    etag = models.CharField(max_length=255, blank=True)
+    last_modified = models.CharField(max_length=64, blank=True)
+    price_checked_at = models.DateTimeField(null=True, blank=True)
+    # The user typed the current price in by hand; the refresh pass leaves it alone
+    manual_price = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # get_shopping_list(): a user's items, needs first, in the order added
+            models.Index(fields=['user', '-priority', 'id'], name='shopping_user_priority_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.user.username})"
+
+    @property
+    def price_pending(self):
+        return self.price_status == 'pending'
+
+    @property
+    def price_dropped(self):
+        return self.previous_price is not None and self.price < self.previous_price
     
     @property
     def can_afford(self):
         """Check if user can afford this item based on their available funds and budget"""
-        try:
-            profile = FinanceProfile.objects.get(user=self.user)
-            
-            # First check: Do they have enough total funds?
-            if profile.total_funds < self.price:
-                return False
-            
-            # If they have no monthly income set, just check total funds
-            if profile.monthly_income <= 0:
-                return True
-            
-            # Get budget allocation
-            budget = profile.budget_allocation
-            category = 'needs' if self.priority else 'wants'
-            
-            # Get spending in this category for current month
-            from django.db.models import Sum
-            import datetime
-            thirty_days_ago = datetime.datetime.now() - datetime.timedelta(days=30)
-            
-            spent_this_month = Transaction.objects.filter(
-                finance_profile=profile,
-                category=category,
-                transaction_type='debit',
-                created_at__gte=thirty_days_ago
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            # Calculate remaining budget for this category
-            category_budget = budget.get(category, 0)
-            remaining_budget = category_budget - float(spent_this_month)
-            
-            # For needs: Allow if they have funds, even if over budget (essentials)
-            if self.priority:  # It's a need
-                return True  # Always allow needs if they have the money
-            
-            # For wants: Check budget compliance, but be more lenient
-            if remaining_budget >= float(self.price):
-                return True
-            
-            # Allow wants if they haven't overspent too much (within 20% of budget)
-            overspend_limit = category_budget * 0.2
-            if abs(remaining_budget) <= overspend_limit:
-                return True
-                
-            return False
-            
-        except:
-            # If no profile exists, just check if they have any funds
-            return True
+        return self._affordability[0]
     
     @property
     def affordability_message(self):
         """Get message about affordability status"""
-        try:
-            profile = FinanceProfile.objects.get(user=self.user)
-            
-            # Check total funds first
-            if profile.total_funds < self.price:
-                return "❌ Insufficient funds"
-            
-            if self.can_afford:
-                if self.priority:
-                    return "✅ Essential - You can afford this!"
-                else:
-                    return "✅ You can afford this!"
+        return self._affordability[1]
+
+    @property
+    def _affordability(self):
+        # annotate_affordability() fills this in for whole lists; a lone item
+        # falls back to loading the profile and its spend itself
+        if not hasattr(self, '_affordability_cache'):
+            if ShoppingListItem.user.is_cached(self):
+                profile = FinanceProfile.for_user(self.user, create=False)
             else:
-                if self.priority:
-                    return "✅ Essential - You can afford this!"  # Needs should always show as affordable if funds exist
-                else:
-                    return "⚠️ Over wants budget (but you have funds)"
-                    
-        except:
-            return "ℹ️ Set up your finance profile for budget tracking"
+                profile = FinanceProfile.objects.filter(user_id=self.user_id).first()
+            spent = profile.spent_by_category() if profile else {}
+            self._affordability_cache = assess_affordability(self.price, self.priority, profile, spent)
+        return self._affordability_cache
+
+
+def assess_affordability(price, priority, profile, spent_by_category):
+    """
+    Decide whether an item is affordable for a profile.
+    Returns a (can_afford, message) tuple. spent_by_category holds the debit
+    totals of the last 30 days, as returned by FinanceProfile.spent_by_category
+    """
+    if profile is None:
+        # If no profile exists, just check if they have any funds
+        return True, "ℹ️ Set up your finance profile for budget tracking"
+
+    # First check: Do they have enough total funds?
+    if profile.total_funds < price:
+        return False, "❌ Insufficient funds"
+
+    # Needs and profiles without a monthly income only depend on total funds
+    if priority:
+        return True, "✅ Essential - You can afford this!"
+    if profile.monthly_income <= 0:
+        return True, "✅ You can afford this!"
+
+    # Calculate remaining budget for the wants category
+    category_budget = profile.budget_allocation.get('wants', 0)
+    spent_this_month = spent_by_category.get('wants', 0)
+    remaining_budget = category_budget - float(spent_this_month)
+
+    # For wants: Check budget compliance, but be more lenient
+    if remaining_budget >= float(price):
+        return True, "✅ You can afford this!"
+
+    # Allow wants if they haven't overspent too much (within 20% of budget)
+    overspend_limit = category_budget * 0.2
+    if abs(remaining_budget) <= overspend_limit:
+        return True, "✅ You can afford this!"
+
+    return False, "⚠️ Over wants budget (but you have funds)"
+
+class PriceHistory(models.Model):
+    """A shopping item's price, recorded each time the refresh pass sees it change"""
+    item = models.ForeignKey(ShoppingListItem, on_delete=models.CASCADE, related_name="price_history")
+    observed_at = models.DateTimeField(default=timezone.now)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        ordering = ['-observed_at']
+        indexes = [
+            models.Index(fields=['item', '-observed_at'], name='price_history_item_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item.name}: ₹{self.price} at {self.observed_at:%Y-%m-%d %H:%M}"
+
+
+class FinanceProfileQuerySet(models.QuerySet):
+    def bump_ledger_version(self):
+        """
+        Mark these profiles' ledgers as changed after a bulk write that
+        skipped Transaction.save(): memoized scores and the owners' cached
+        pages expire
+        """
+        user_ids = list(self.values_list('user_id', flat=True))
+        self.update(ledger_version=F('ledger_version') + 1)
+        for user_id in user_ids:
+            invalidate_user(user_id)
+
+    def with_score_totals(self):
+        """Annotate the financial score inputs so a whole list scores without extra queries"""
+        return self.annotate(
+            score_count=Sum('daily_spend__count'),
+            score_needs=Sum('daily_spend__total', filter=Q(
+                daily_spend__category='needs', daily_spend__transaction_type='debit')),
+            score_wants=Sum('daily_spend__total', filter=Q(
+                daily_spend__category='wants', daily_spend__transaction_type='debit')),
+            score_savings=Sum('daily_spend__total', filter=Q(
+                daily_spend__category='savings', daily_spend__transaction_type='credit')),
+        )
+
 
 class FinanceProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="finance_profile")
     total_funds = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     monthly_income = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Bumped on every transaction write; used to key cached per-profile values
+    ledger_version = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = FinanceProfileQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.user.username} - ₹{self.total_funds}"
 
+    @classmethod
+    def for_user(cls, user, create=True):
+        """
+        The user's profile, memoized on the user object: fetched (or created
+        when `create`) at most once per user instance, and free when the
+        user was loaded with select_related('finance_profile'). None when
+        the user has none and create is False
+        """
+        try:
+            return user.finance_profile
+        except cls.DoesNotExist:
+            if not create:
+                return None
+        profile, created = cls.objects.get_or_create(user=user)
+        user.finance_profile = profile
+        return profile
+
     @property
     def budget_allocation(self):
         """Smart budget allocation based on best practices"""
@@ -113,47 +193,95 @@ class FinanceProfile(models.Model):
             'savings': round(income * 0.20, 2),  # 20% for savings/investments
         }
 
+    def window_totals(self, days=30):
+        """
+        Totals per (category, transaction_type) over the last `days` days.
+        Reads the daily buckets, so it touches at most a few rows per day
+        """
+        since = (timezone.now() - datetime.timedelta(days=days)).date()
+        rows = self.daily_spend.filter(day__gte=since).order_by().values(
+            'category', 'transaction_type'
+        ).annotate(sum=Sum('total'))
+        return {(row['category'], row['transaction_type']): row['sum'] for row in rows}
+
+    def spent_by_category(self, days=30):
+        """Debit totals per category over the last `days` days, in one query"""
+        totals = self.window_totals(days)
+        return {category: total for (category, kind), total in totals.items() if kind == 'debit'}
+
     @property
     def financial_score(self):
         """Calculate financial health score out of 100"""
-        transactions = self.transactions.all()
-        if not transactions:
-            return 75  # Default score for new users
-        
-        # Calculate spending patterns
-        needs_spending = sum(float(t.amount) for t in transactions.filter(category='needs', transaction_type='debit'))
-        wants_spending = sum(float(t.amount) for t in transactions.filter(category='wants', transaction_type='debit'))
-        savings = sum(float(t.amount) for t in transactions.filter(category='savings', transaction_type='credit'))
-        
-        total_spending = needs_spending + wants_spending
-        if total_spending == 0:
-            return 75
-        
-        # Score calculation based on spending patterns
-        needs_ratio = needs_spending / total_spending if total_spending > 0 else 0
-        wants_ratio = wants_spending / total_spending if total_spending > 0 else 0
-        savings_ratio = savings / float(self.monthly_income) if self.monthly_income > 0 else 0
-        
-        score = 0
-        # Good needs spending (40-60% of income)
-        if 0.4 <= needs_ratio <= 0.6:
-            score += 40
-        else:
-            score += max(0, 40 - abs(needs_ratio - 0.5) * 80)
-        
-        # Controlled wants spending (20-35% of income)
-        if 0.2 <= wants_ratio <= 0.35:
-            score += 30
-        else:
-            score += max(0, 30 - abs(wants_ratio - 0.275) * 100)
-        
-        # Good savings rate (15%+ of income)
-        if savings_ratio >= 0.15:
-            score += 30
-        else:
-            score += savings_ratio * 200  # Scale to 30 points max
-        
-        return min(100, max(0, round(score)))
+        if hasattr(self, 'score_needs'):
+            # Totals were annotated by FinanceProfileQuerySet.with_score_totals()
+            return score_from_totals(self.score_needs, self.score_wants, self.score_savings,
+                                     self.monthly_income, self.score_count)
+
+        # Memoized per ledger version: any transaction write bumps the
+        # version, so a stale score is never read back
+        key = f"financial_score:{self.pk}:{self.ledger_version}:{self.monthly_income}"
+        cached = getattr(self, '_financial_score_cache', None)
+        if cached and cached[0] == key:
+            return cached[1]
+        score = cache.get(key)
+        if score is None:
+            totals = self.daily_spend.aggregate(**SCORE_TOTALS)
+            score = score_from_totals(totals['needs'], totals['wants'], totals['savings'],
+                                      self.monthly_income, totals['count'])
+            cache.set(key, score, timeout=None)
+        self._financial_score_cache = (key, score)
+        return score
+
+
+# All-time totals the financial score is based on, as one conditional aggregate
+# over the daily buckets
+SCORE_TOTALS = {
+    'count': Sum('count'),
+    'needs': Sum('total', filter=Q(category='needs', transaction_type='debit')),
+    'wants': Sum('total', filter=Q(category='wants', transaction_type='debit')),
+    'savings': Sum('total', filter=Q(category='savings', transaction_type='credit')),
+}
+
+
+def score_from_totals(needs_spending, wants_spending, savings, monthly_income, transaction_count):
+    """Financial health score out of 100 from all-time category totals"""
+    if not transaction_count:
+        return 75  # Default score for new users
+
+    # Calculate spending patterns
+    needs_spending = float(needs_spending or 0)
+    wants_spending = float(wants_spending or 0)
+    savings = float(savings or 0)
+
+    total_spending = needs_spending + wants_spending
+    if total_spending == 0:
+        return 75
+
+    # Score calculation based on spending patterns
+    needs_ratio = needs_spending / total_spending
+    wants_ratio = wants_spending / total_spending
+    savings_ratio = savings / float(monthly_income) if monthly_income > 0 else 0
+
+    score = 0
+    # Good needs spending (40-60% of income)
+    if 0.4 <= needs_ratio <= 0.6:
+        score += 40
+    else:
+        score += max(0, 40 - abs(needs_ratio - 0.5) * 80)
+
+    # Controlled wants spending (20-35% of income)
+    if 0.2 <= wants_ratio <= 0.35:
+        score += 30
+    else:
+        score += max(0, 30 - abs(wants_ratio - 0.275) * 100)
+
+    # Good savings rate (15%+ of income)
+    if savings_ratio >= 0.15:
+        score += 30
+    else:
+        score += savings_ratio * 200  # Scale to 30 points max
+
+    return min(100, max(0, round(score)))
 
 class Transaction(models.Model):
     TRANSACTION_TYPES = [
@@ -167,20 +295,173 @@ class Transaction(models.Model):
         ('savings', 'Savings'),
     ]
     
-    finance_profile = models.ForeignKey(FinanceProfile, on_delete=models.CASCADE, related_name="transactions")
+    # No index of its own: every index in Meta leads with finance_profile
+    finance_profile = models.ForeignKey(FinanceProfile, on_delete=models.CASCADE, related_name="transactions",
+                                        db_index=False)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     transaction_type = models.CharField(max_length=6, choices=TRANSACTION_TYPES)
     category = models.CharField(max_length=10, choices=CATEGORIES)
     description = models.CharField(max_length=255)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Defaults to now; statement imports set the booking date instead
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Fingerprint of the statement row this came from, for duplicate detection
+    import_hash = models.CharField(max_length=40, null=True, blank=True, editable=False)
     
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['finance_profile', 'import_hash'],
+                condition=Q(import_hash__isnull=False),
+                name='unique_statement_row',
+            ),
+        ]
+        indexes = [
+            # History paging by (created_at, id) cursor, unfiltered and by filter
+            models.Index(fields=['finance_profile', 'created_at', 'id'], name='txn_profile_created_idx'),
+            models.Index(fields=['finance_profile', 'category', 'created_at', 'id'], name='txn_profile_category_idx'),
+            models.Index(fields=['finance_profile', 'transaction_type', 'created_at', 'id'], name='txn_profile_type_idx'),
+            # Both filters, and the per-category window aggregates
+            models.Index(fields=['finance_profile', 'category', 'transaction_type', 'created_at'],
+                         name='txn_profile_cat_type_idx'),
+        ]
     
     def __str__(self):
         sign = '+' if self.transaction_type == 'credit' else '-'
         return f"{sign}₹{self.amount} - {self.description}"
 
+    def save(self, *args, **kwargs):
+        # Keep the daily buckets in the same DB transaction as the row itself;
+        # deletes are handled by the post_delete receiver in signals.py
+        with db_transaction.atomic():
+            if self.pk and not self._state.adding:
+                previous = Transaction.objects.filter(pk=self.pk).first()
+                if previous:
+                    DailySpend.record(previous, sign=-1)
+            super().save(*args, **kwargs)
+            DailySpend.record(self)
+            self.bump_ledger_version()
+
+    def bump_ledger_version(self):
+        """Mark the profile's ledger as changed so cached per-profile values expire"""
+        FinanceProfile.objects.filter(pk=self.finance_profile_id).update(
+            ledger_version=F('ledger_version') + 1
+        )
+        # Keep an already loaded profile in step, so a later profile.save()
+        # doesn't write the old version back
+        if Transaction.finance_profile.is_cached(self):
+            self.finance_profile.ledger_version += 1
+
+class DailySpend(models.Model):
+    """Per-day rollup of a profile's transactions by category and type"""
+    finance_profile = models.ForeignKey(FinanceProfile, on_delete=models.CASCADE, related_name="daily_spend")
+    day = models.DateField()
+    category = models.CharField(max_length=10, choices=Transaction.CATEGORIES)
+    transaction_type = models.CharField(max_length=6, choices=Transaction.TRANSACTION_TYPES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['finance_profile', 'day', 'category', 'transaction_type'],
+                name='unique_daily_spend_bucket',
+            ),
+        ]
+        indexes = [
+            # window_totals(): per (category, type) sums over a day range come
+            # out of the index in GROUP BY order, total included, without
+            # touching the table or sorting
+            models.Index(fields=['finance_profile', 'category', 'transaction_type', 'day', 'total'],
+                         name='daily_spend_window_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.finance_profile.user.username} {self.day} {self.category}/{self.transaction_type}: ₹{self.total}"
+
+    @classmethod
+    def record(cls, txn, sign=1):
+        """Add (sign=1) or remove (sign=-1) a transaction from its bucket"""
+        key = {
+            'finance_profile_id': txn.finance_profile_id,
+            'day': timezone.localdate(txn.created_at),
+            'category': txn.category,
+            'transaction_type': txn.transaction_type,
+        }
+        if sign > 0:
+            cls.objects.get_or_create(**key)
+        # Removals never create a bucket: when the profile itself is being
+        # deleted its buckets may already be gone
+        cls.objects.filter(**key).update(
+            total=F('total') + sign * txn.amount,
+            count=F('count') + sign,
+        )
+
+    @classmethod
+    def rebuild(cls, profiles=None, since=None):
+        """
+        Recompute buckets from the raw Transaction table and bump the
+        ledger version of the profiles rebuilt.
+        profiles limits the rebuild to a queryset of FinanceProfiles and
+        since to the days from that date on
+        """
+        transactions = Transaction.objects.all()
+        buckets = cls.objects.all()
+        if profiles is not None:
+            transactions = transactions.filter(finance_profile__in=profiles)
+            buckets = buckets.filter(finance_profile__in=profiles)
+        if since is not None:
+            start = timezone.make_aware(datetime.datetime.combine(since, datetime.time.min))
+            transactions = transactions.filter(created_at__gte=start)
+            buckets = buckets.filter(day__gte=since)
+
+        rows = transactions.order_by().annotate(day=TruncDate('created_at')).values(
+            'finance_profile_id', 'day', 'category', 'transaction_type'
+        ).annotate(sum=Sum('amount'), n=Count('id'))
+
+        with db_transaction.atomic():
+            buckets.delete()
+            cls.objects.bulk_create(
+                (cls(
+                    finance_profile_id=row['finance_profile_id'],
+                    day=row['day'],
+                    category=row['category'],
+                    transaction_type=row['transaction_type'],
+                    total=row['sum'],
+                    count=row['n'],
+                ) for row in rows.iterator()),
+                batch_size=1000,
+            )
+            # The rebuilt totals may differ from what cached values were built from
+            changed = FinanceProfile.objects.all()
+            if profiles is not None:
+                changed = changed.filter(pk__in=profiles)
+            changed.bump_ledger_version()
+
+class DomainStrategy(models.Model):
+    """The price extraction strategy that last worked for a retailer domain"""
+    STRATEGIES = [
+        ('jsonld', 'JSON-LD'),
+        ('meta', 'Meta tag'),
+        ('text', 'Text regex'),
+    ]
+
+    domain = models.CharField(max_length=255, unique=True)
+    strategy = models.CharField(max_length=6, choices=STRATEGIES)
+    # JSON path for jsonld ("@graph/1/offers/0/price"), attribute=value for meta
+    locator = models.CharField(max_length=255, blank=True)
+    hits = models.PositiveIntegerField(default=0)
+    misses = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.domain}: {self.strategy} {self.locator}".strip()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return round(self.hits / lookups * 100, 1) if lookups else 0
+
 # Keep the old finance model for backward compatibility
 class finance(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE,related_name="finance")
@@ -1,12 +1,23 @@
-from .models import ShoppingListItem
-import requests
+from .models import ShoppingListItem, DomainStrategy, PriceHistory, assess_affordability
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
+from decimal import Decimal
+from html import unescape
+from . import scraper
+from .cache import invalidate_user
+from shadow import profiling
+import csv
+import io
 import re
 import json
+import logging
+import threading
 
-headers = {
-    "User-Agent": "Mozilla/5.0"
-}
+logger = logging.getLogger(__name__)
 
 def clean_price_input(price_input):
     """
@@ -41,28 +52,238 @@ def push_item(user, item_name, item_link, item_price, priority=False):
     # Clean the price input using our helper function
     item_price = clean_price_input(item_price)
     
-    if item_price == 0 or str(item_price).lower() == "auto":
-        try:
-            item_price = extract_price(item_link)
-            item_price = clean_price_input(item_price) if item_price else 0.0
-        except:
-            print("error getting price automatically.")
-            item_price = 0.0
-    
-    if item_price is None:
-        print("couldnt fetch price")
-        item_price = 0.0
+    # Without a price the item is saved straight away and the price is
+    # fetched from the link in the background
+    price_status = 'ready'
+    if item_price == 0 and item_link:
+        price_status = 'pending'
     
-    new_item = ShoppingListItem(user=user, name=item_name, price=item_price, link=item_link, priority=priority)
+    new_item = ShoppingListItem(user=user, name=item_name, price=item_price, link=item_link,
+                                priority=priority, price_status=price_status)
     new_item.save()
+    if price_status == 'pending':
+        queue_price_fetch(new_item)
+    return new_item
+
+_price_executor = None
+_price_executor_lock = threading.Lock()
+# Items submitted to this process's pool and not finished yet
+_in_flight = set()
+
+def get_price_executor():
+    """Shared pool of background price fetch workers, created on first use"""
+    global _price_executor
+    with _price_executor_lock:
+        if _price_executor is None:
+            _price_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "PRICE_FETCH_WORKERS", 4),
+                thread_name_prefix="price-fetch",
+            )
+        return _price_executor
+
+def queue_price_fetch(item):
+    """Resolve an item's price on the worker pool once the current DB transaction commits"""
+    queue_price_fetches([item.pk])
+
+def queue_price_fetches(item_ids):
+    item_ids = list(item_ids)
+    def submit():
+        executor = get_price_executor()
+        for item_id in item_ids:
+            with _price_executor_lock:
+                _in_flight.add(item_id)
+            executor.submit(resolve_price, item_id)
+    transaction.on_commit(submit)
+
+def requeue_stale_prices(user):
+    """
+    Queue the user's pending items that no worker in this process is
+    fetching. The queue lives in memory, so a restart or crashed worker
+    leaves items pending until something submits them again; a duplicate
+    fetch from another process is harmless as only pending rows are written.
+    Returns how many items were queued
+    """
+    pending = ShoppingListItem.objects.filter(user=user, price_status='pending').values_list('pk', flat=True)
+    with _price_executor_lock:
+        stale = [item_id for item_id in pending if item_id not in _in_flight]
+    queue_price_fetches(stale)
+    return len(stale)
+
+def resolve_prices(item_ids, workers=None):
+    """Resolve many pending prices concurrently and wait for all of them"""
+    workers = workers or getattr(settings, "PRICE_FETCH_WORKERS", 4)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="price-import") as pool:
+        list(pool.map(resolve_price, item_ids))
+
+def resolve_price(item_id):
+    """Fetch the price of a pending item and store it. Runs on a worker thread"""
+    try:
+        with profiling.sampled("resolve_price"):
+            resolve_pending_price(item_id)
+    finally:
+        with _price_executor_lock:
+            _in_flight.discard(item_id)
+        # Worker threads get their own connections, don't leave them open
+        connections.close_all()
 
-def fetch_html(url):
+def resolve_pending_price(item_id):
+    item = ShoppingListItem.objects.filter(pk=item_id, price_status='pending').first()
+    if item is None:
+        return
+    validators = {}
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.text
-    except:
+        item_price, validators = fetch_price(item.link)
+        item_price = clean_price_input(item_price) if item_price else 0.0
+    except Exception:
+        logger.exception("error getting price automatically for %s", item.link)
+        item_price = 0.0
+    # Only fill in items that are still pending, the user may have
+    # entered a price by hand in the meantime. The validators let the first
+    # refresh be a conditional GET
+    ShoppingListItem.objects.filter(pk=item_id, price_status='pending').update(
+        price=item_price,
+        price_status='ready' if item_price else 'failed',
+        price_checked_at=timezone.now(),
+        **validators
+    )
+    invalidate_user(item.user_id)
+
+def refresh_price(item_id):
+    """
+    Re-check an item's price with a conditional GET. An unchanged page costs
+    a 304 and no parsing; a changed price is written to PriceHistory.
+    Returns True when the price changed. Runs on a worker thread
+    """
+    try:
+        with profiling.sampled("refresh_price"):
+            return refresh_item_price(item_id)
+    finally:
+        connections.close_all()
+
+def refresh_item_price(item_id):
+    item = ShoppingListItem.objects.filter(pk=item_id).exclude(link="").first()
+    if item is None or item.price_pending or item.manual_price:
+        return False
+    conditional = {}
+    if item.etag:
+        conditional["If-None-Match"] = item.etag
+    if item.last_modified:
+        conditional["If-Modified-Since"] = item.last_modified
+
+    checked = ShoppingListItem.objects.filter(pk=item_id)
+    now = timezone.now()
+    response = scraper.get(item.link, headers=conditional)
+    if response is None or response.status_code == 304 or not response.ok:
+        checked.update(price_checked_at=now)
+        return False
+
+    validators = response_validators(response)
+    price = extract_price_from_html(response.text, domain=scraper.domain_of(item.link))
+    price = Decimal(str(clean_price_input(price))).quantize(Decimal("0.01")) if price else None
+    if price is None or price == item.price:
+        checked.update(price_checked_at=now, **validators)
+        return False
+
+    with transaction.atomic():
+        # The user may have typed a price in while this page was being fetched
+        if not checked.filter(manual_price=False).update(price=price, previous_price=item.price,
+                                                         price_status='ready', price_checked_at=now, **validators):
+            return False
+        PriceHistory.objects.create(item_id=item_id, price=price, observed_at=now)
+        invalidate_user(item.user_id)
+    scraper.price_cache.set(scraper.normalize_url(item.link), (str(price), validators))
+    return True
+
+def refresh_prices(item_ids, workers=None):
+    """Refresh many items concurrently, returns how many prices changed"""
+    workers = workers or getattr(settings, "PRICE_FETCH_WORKERS", 4)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="price-refresh") as pool:
+        return sum(pool.map(refresh_price, item_ids))
+
+def parse_shopping_file(fileobj, filename=""):
+    """
+    Yield one dict per row of an uploaded shopping list.
+    CSV (with a header row) and JSON lines files are streamed row by row;
+    a plain .json file holds one array, which json has to read whole
+    """
+    name = filename.lower()
+    if name.endswith((".jsonl", ".ndjson")):
+        for line in io.TextIOWrapper(fileobj, encoding="utf-8"):
+            if line.strip():
+                yield json.loads(line)
+    elif name.endswith(".json"):
+        data = json.load(io.TextIOWrapper(fileobj, encoding="utf-8"))
+        items = data.get("items", []) if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            raise ValueError("expected a list of items")
+        yield from items
+    else:
+        yield from csv.DictReader(io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline=""))
+
+# ShoppingListItem.price holds at most 10 digits, 2 of them decimals
+MAX_ITEM_PRICE = Decimal("100000000")
+
+def parse_item_price(value):
+    """An imported price as a Decimal, None when it's negative or too large to store"""
+    price = Decimal(str(clean_price_input(value)))
+    if not price.is_finite() or price < 0 or price >= MAX_ITEM_PRICE:
+        return None
+    return price.quantize(Decimal("0.01"))
+
+def normalize_shopping_row(row):
+    """
+    Map an imported row onto ShoppingListItem fields.
+    Accepts name/item-name, link/url, price and priority/type columns;
+    returns None for rows without a name or with a price that can't be stored
+    """
+    if not isinstance(row, dict):
+        return None
+    row = {str(key).strip().lower().replace("-", "_").replace(" ", "_"): value for key, value in row.items()}
+    name = str(row.get("name") or row.get("item_name") or "").strip()
+    if not name:
         return None
+    price = parse_item_price(row.get("price") or row.get("item_price"))
+    if price is None:
+        return None
+    link = str(row.get("link") or row.get("item_link") or row.get("url") or "").strip()
+    priority = str(row.get("priority") or row.get("type") or row.get("item_priority") or "").strip().lower()
+    return {
+        "name": name[:255],
+        "link": link,
+        "price": price,
+        "priority": priority in ("need", "needs", "true", "1", "yes"),
+    }
+
+def import_shopping_items(user, rows, chunk_size=500):
+    """
+    Insert imported rows with bulk_create, `chunk_size` at a time.
+    Items without a price but with a link are left pending.
+    Returns (created, skipped, pending_ids)
+    """
+    created = skipped = 0
+    pending_ids = []
+    batch = []
+
+    def flush():
+        ShoppingListItem.objects.bulk_create(batch)
+        # SQLite 3.35+ returns the new primary keys from a bulk insert
+        pending_ids.extend(item.pk for item in batch if item.price_status == 'pending' and item.pk)
+        batch.clear()
+
+    for row in rows:
+        fields = normalize_shopping_row(row)
+        if fields is None:
+            skipped += 1
+            continue
+        price_status = 'pending' if fields["price"] == 0 and fields["link"] else 'ready'
+        batch.append(ShoppingListItem(user=user, price_status=price_status, **fields))
+        created += 1
+        if len(batch) >= chunk_size:
+            flush()
+    if batch:
+        flush()
+    invalidate_user(user.pk)
+    return created, skipped, pending_ids
 
 def extract_jsonld_price(soup):
     scripts = soup.find_all("script", type="application/ld+json")
@@ -92,27 +313,218 @@ def extract_text_price(soup):
         return prices[0]  # return first reasonable match
     return None
 
+def response_validators(response):
+    """The response's cache validators, stored on the item for the refresh pass to send back"""
+    return {
+        "etag": response.headers.get("ETag", "")[:255],
+        "last_modified": response.headers.get("Last-Modified", "")[:64],
+    }
+
+def fetch_price(url):
+    """
+    (price, validators) for a product link, served from the price cache
+    when the same product was fetched recently. price is None and
+    validators empty when the page couldn't be fetched or has no price
+    """
+    cache_key = scraper.normalize_url(url)
+    cached = scraper.price_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    response = scraper.get(url)
+    if response is None or not response.ok:
+        return None, {}
+    price = extract_price_from_html(response.text, domain=scraper.domain_of(url))
+    if not price:
+        return None, {}
+    scraper.price_cache.set(cache_key, (price, response_validators(response)))
+    return price, response_validators(response)
+
 def extract_price(url):
-    html = fetch_html(url)
-    if not html:
-        return None
-    
-    soup = BeautifulSoup(html, "html.parser")
+    return fetch_price(url)[0]
 
-    # Strategy 1: JSON-LD
-    price = extract_jsonld_price(soup)
-    if price:
-        return price
+JSONLD_SCRIPT_RE = re.compile(
+    r'<script\b[^>]*\btype\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script\s*>',
+    re.IGNORECASE | re.DOTALL,
+)
+HEAD_END_RE = re.compile(r'</head\s*>|<body[\s>]', re.IGNORECASE)
+META_TAG_RE = re.compile(r'<meta\b[^>]*>', re.IGNORECASE)
+ATTRIBUTE_RE = re.compile(r'([^\s=/>"\']+)\s*=\s*("[^"]*"|\'[^\']*\'|[^\s>]+)')
+PRICE_META_ATTRIBUTES = {
+    "property": ["product:price:amount", "og:price:amount"],
+    "name": ["price", "twitter:data1"],
+}
 
-    # Strategy 2: Meta Tags
-    price = extract_meta_price(soup)
+def jsonld_blocks(html):
+    """Decoded contents of every application/ld+json script, found without parsing the page"""
+    if 'ld+json' not in html:
+        return []
+    blocks = []
+    for match in JSONLD_SCRIPT_RE.finditer(html):
+        try:
+            blocks.append(json.loads(match.group(1)))
+        except ValueError:
+            continue
+    return blocks
+
+def jsonld_offer_price(data, path=()):
+    """
+    Find the first offer price in a JSON-LD document, including @graph
+    documents, top-level lists and lists of offers.
+    Returns (price, path) with path being the keys/indexes leading to it
+    """
+    if isinstance(data, list):
+        for index, value in enumerate(data):
+            price, found = jsonld_offer_price(value, path + (index,))
+            if price:
+                return price, found
+    elif isinstance(data, dict):
+        offers = data.get("offers")
+        if offers is not None:
+            offer_list = offers if isinstance(offers, list) else [offers]
+            for index, offer in enumerate(offer_list):
+                if not isinstance(offer, dict):
+                    continue
+                offer_path = path + ("offers",) + ((index,) if isinstance(offers, list) else ())
+                for key in ("price", "lowPrice"):
+                    if offer.get(key):
+                        return offer[key], offer_path + (key,)
+        for key in ("@graph", "mainEntity", "itemListElement", "item"):
+            if key in data:
+                price, found = jsonld_offer_price(data[key], path + (key,))
+                if price:
+                    return price, found
+    return None, None
+
+def jsonld_value_at(data, path):
+    """Follow a stored "a/0/b" JSON path, None if the document doesn't have it"""
+    for key in path.split("/"):
+        if isinstance(data, list) and key.isdigit() and int(key) < len(data):
+            data = data[int(key)]
+        elif isinstance(data, dict):
+            data = data.get(key)
+        else:
+            return None
+    return data
+
+def head_meta_tags(html):
+    """Attribute dicts of the <meta> tags before the end of <head>"""
+    match = HEAD_END_RE.search(html)
+    if not match:
+        return []
+    tags = []
+    for tag in META_TAG_RE.findall(html, 0, match.start()):
+        attrs = {}
+        for name, value in ATTRIBUTE_RE.findall(tag[5:]):
+            attrs.setdefault(name.lower(), unescape(value.strip('"\'')))
+        tags.append(attrs)
+    return tags
+
+def meta_tag_price(meta):
+    """
+    Price of a meta tag (an attribute dict or a BeautifulSoup tag).
+    Returns (found, price, locator), found is False for unrelated tags
+    """
+    for attribute, values in PRICE_META_ATTRIBUTES.items():
+        value = (meta.get(attribute) or "").lower()
+        if value in values:
+            return True, meta.get("content"), f"{attribute}={value}"
+    return False, None, None
+
+def learned_locator(learned, strategy):
+    """The locator a domain learned for `strategy`, None if it learned another strategy"""
+    if learned is not None and learned.strategy == strategy:
+        return learned.locator
+    return None
+
+def meta_price(tags, preferred=None):
+    """
+    Price from a list of meta tags (attribute dicts or BeautifulSoup tags).
+    The tag matching the `preferred` attribute=value locator wins; otherwise
+    the first price tag counts, even when it's empty.
+    Returns (found, price, locator)
+    """
+    if preferred:
+        attribute, _, value = preferred.partition("=")
+        for meta in tags:
+            if (meta.get(attribute) or "").lower() == value and meta.get("content"):
+                return True, meta.get("content"), preferred
+    for meta in tags:
+        found, price, locator = meta_tag_price(meta)
+        if found:
+            return True, price, locator
+    return False, None, None
+
+def find_price(html, learned=None):
+    """
+    Run the full strategy chain: JSON-LD, meta tags, text regex.
+    Structured data always comes first and runs on a prescan of the raw
+    HTML; a BeautifulSoup tree is only built when it finds nothing. A
+    DomainStrategy in `learned` only decides which JSON path or meta tag is
+    tried first, it never skips a strategy.
+    Returns (price, strategy, locator)
+    """
+    # Strategy 1: JSON-LD, only the script blocks are decoded
+    blocks = jsonld_blocks(html)
+    path = learned_locator(learned, 'jsonld')
+    if path:
+        for data in blocks:
+            price = jsonld_value_at(data, path)
+            if price and isinstance(price, (str, int, float)):
+                return price, 'jsonld', path
+    for data in blocks:
+        price, found = jsonld_offer_price(data)
+        if price:
+            return price, 'jsonld', "/".join(str(key) for key in found)
+
+    # Strategy 2: Meta Tags in <head>
+    preferred = learned_locator(learned, 'meta')
+    found, price, locator = meta_price(head_meta_tags(html), preferred)
     if price:
-        return price
+        return price, 'meta', locator
+
+    # Last resort: parse the whole page for meta tags outside <head> and the
+    # regex scan over its text
+    soup = BeautifulSoup(html, "html.parser")
+    if not found:
+        found, price, locator = meta_price(soup.find_all("meta"), preferred)
+        if price:
+            return price, 'meta', locator
 
     # Strategy 3: Regex scan
     price = extract_text_price(soup)
+    return price, ('text' if price else None), ''
+
+def extract_price_from_html(html, domain=None):
+    """
+    Extract a price from a product page. With a domain, the JSON path or
+    meta tag that worked last time for that retailer is tried first within
+    its strategy; a page that finds its price elsewhere is relearned
+    """
+    learned = DomainStrategy.objects.filter(domain=domain).first() if domain else None
+    price, strategy, locator = find_price(html, learned)
+    if learned and strategy == learned.strategy and locator == learned.locator:
+        DomainStrategy.objects.filter(pk=learned.pk).update(hits=F('hits') + 1)
+    elif domain and (learned or strategy):
+        remember_strategy(domain, strategy, locator)
     return price
 
+def remember_strategy(domain, strategy, locator):
+    """
+    Count a miss for the domain and store the strategy the full chain found.
+    Uses single-statement writes rather than update_or_create's
+    read-then-write transaction, which deadlocks between SQLite workers
+    """
+    changes = {'misses': F('misses') + 1, 'updated_at': timezone.now()}
+    if strategy:
+        changes.update(strategy=strategy, locator=locator)
+    if DomainStrategy.objects.filter(domain=domain).update(**changes) or not strategy:
+        return
+    try:
+        DomainStrategy.objects.create(domain=domain, strategy=strategy, locator=locator, misses=1)
+    except IntegrityError:
+        # Another worker learned this domain first
+        DomainStrategy.objects.filter(domain=domain).update(**changes)
+
 def list_exists(user)->bool:
     shopping_list = ShoppingListItem.objects.filter(user=user)
     if shopping_list.exists():
@@ -123,7 +535,22 @@ def list_exists(user)->bool:
 
 # Fetch all shopping list items for a user
 def get_shopping_list(user):
-    return ShoppingListItem.objects.filter(user=user)
+    """A user's items, needs before wants, each in the order they were added"""
+    return ShoppingListItem.objects.filter(user=user).order_by('-priority', 'id')
+
+def annotate_affordability(items, profile, spent=None):
+    """
+    Work out can_afford/affordability_message for every item in one pass.
+    The profile's category spend is loaded once (or taken from `spent`), so
+    the cost stays constant no matter how many items there are.
+    Returns the items as a list
+    """
+    items = list(items)
+    if spent is None:
+        spent = profile.spent_by_category() if profile else {}
+    for item in items:
+        item._affordability_cache = assess_affordability(item.price, item.priority, profile, spent)
+    return items
 
 
 
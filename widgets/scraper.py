@@ -0,0 +1,174 @@
+"""
+HTTP plumbing for the price scraper: one pooled keep-alive session, a TTL/LRU
+cache of resolved prices and a per-domain circuit breaker
+"""
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+import requests
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+headers = {
+    "User-Agent": "Mozilla/5.0"
+}
+
+# Query parameters that never change which product a link points to
+TRACKING_PARAMS = {"ref", "tag", "fbclid", "gclid"}
+
+
+def normalize_url(url):
+    """Canonical form of a product link, used as the cache key"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "http"
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not (key.lower() in TRACKING_PARAMS or key.lower().startswith("utm_"))
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def domain_of(url):
+    return (urlsplit(url).hostname or "").lower()
+
+
+class TTLCache:
+    """Thread-safe mapping whose entries expire after `ttl` seconds, evicting least recently used past `maxsize`"""
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CircuitBreaker:
+    """
+    Per-domain breaker. After `threshold` consecutive failures a domain is
+    skipped for `reset_timeout` seconds, then a single trial request is let
+    through: success closes the circuit again, failure re-opens it
+    """
+
+    def __init__(self, threshold=3, reset_timeout=300):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures = {}
+        self._opened_at = {}
+        self._lock = threading.Lock()
+
+    def allow(self, domain):
+        with self._lock:
+            opened_at = self._opened_at.get(domain)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at >= self.reset_timeout:
+                # Half-open: let this request through, hold the others back
+                self._opened_at[domain] = time.monotonic()
+                return True
+            return False
+
+    def record_success(self, domain):
+        with self._lock:
+            self._failures.pop(domain, None)
+            self._opened_at.pop(domain, None)
+
+    def record_failure(self, domain):
+        with self._lock:
+            failures = self._failures.get(domain, 0) + 1
+            self._failures[domain] = failures
+            if failures >= self.threshold:
+                if domain not in self._opened_at:
+                    logger.warning("price scraper: opening circuit for %s after %d failures", domain, failures)
+                self._opened_at[domain] = time.monotonic()
+
+    def is_open(self, domain):
+        return domain in self._opened_at
+
+    def clear(self):
+        with self._lock:
+            self._failures.clear()
+            self._opened_at.clear()
+
+
+price_cache = TTLCache(
+    maxsize=getattr(settings, "PRICE_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "PRICE_CACHE_TTL", 3600),
+)
+breaker = CircuitBreaker(
+    threshold=getattr(settings, "SCRAPER_FAILURE_THRESHOLD", 3),
+    reset_timeout=getattr(settings, "SCRAPER_RESET_TIMEOUT", 300),
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Shared keep-alive session, sized for the price fetch worker pool"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = getattr(settings, "PRICE_FETCH_WORKERS", 4)
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=pool_size, max_retries=0)
+            session = requests.Session()
+            session.headers.update(headers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def get(url, **kwargs):
+    """
+    GET through the shared session and the domain's circuit breaker.
+    Returns the response, or None if the domain is tripped or the request
+    failed. Server errors and network failures count against the domain
+    """
+    domain = domain_of(url)
+    if not breaker.allow(domain):
+        logger.info("price scraper: circuit open for %s, skipping %s", domain, url)
+        return None
+    kwargs.setdefault("timeout", getattr(settings, "SCRAPER_TIMEOUT", 10))
+    try:
+        response = get_session().get(url, **kwargs)
+    except requests.RequestException:
+        breaker.record_failure(domain)
+        return None
+    if response.status_code >= 500:
+        breaker.record_failure(domain)
+    else:
+        breaker.record_success(domain)
+    return response
@@ -0,0 +1,179 @@
+"""
+Full-text search over shopping item names and transaction descriptions,
+backed by SQLite FTS5.
+
+Each model has an FTS5 table whose rowid is the row's primary key, with two
+columns: `body`, the searchable text, and `owner`, "u<user id>", so one
+user's search is a single MATCH. Triggers on the model tables keep the
+index in step with every write, .update(), bulk_create() and cascade
+deletes included. Other database backends fall back to unranked
+icontains filtering
+"""
+from django.db import connection as default_connection
+from django.db.models.expressions import RawSQL
+from .models import FinanceProfile, ShoppingListItem, Transaction
+import re
+
+INDEXES = {
+    "items": {
+        "model": ShoppingListItem,
+        "column": "name",
+        "owner_column": "user_id",
+        "owner": "'u' || {row}.user_id",
+    },
+    "transactions": {
+        "model": Transaction,
+        "column": "description",
+        "owner_column": "finance_profile_id",
+        "owner": "'u' || (SELECT user_id FROM widgets_financeprofile WHERE id = {row}.finance_profile_id)",
+    },
+}
+
+TERM = re.compile(r"\w+")
+MAX_TERMS = 8
+
+
+def is_available(connection=default_connection):
+    return connection.vendor == "sqlite"
+
+
+def index_table(kind):
+    return f"{INDEXES[kind]['model']._meta.db_table}_fts"
+
+
+def trigger_sql(kind):
+    spec = INDEXES[kind]
+    table, fts, column = spec["model"]._meta.db_table, index_table(kind), spec["column"]
+    owner = spec["owner"].format(row="new")
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, body, owner) VALUES (new.id, new.{column}, {owner}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {column}, {spec['owner_column']} ON {table} BEGIN "
+        f"UPDATE {fts} SET body = new.{column}, owner = {owner} WHERE rowid = old.id; END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN "
+        f"DELETE FROM {fts} WHERE rowid = old.id; END",
+    ]
+
+
+def install(connection):
+    """Create the index tables and their triggers; safe to repeat"""
+    with connection.cursor() as cursor:
+        for kind in INDEXES:
+            # Prefix indexes make 2 and 3 letter search-as-you-type lookups cheap
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {index_table(kind)} USING fts5("
+                           f"body, owner, prefix='2 3', tokenize='unicode61 remove_diacritics 2')")
+            for sql in trigger_sql(kind):
+                cursor.execute(sql)
+
+
+def install_triggers(connection):
+    """
+    Recreate missing triggers where the index exists. SQLite migrations that
+    rebuild a table drop its triggers along with the old copy
+    """
+    if not is_available(connection):
+        return
+    tables = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        for kind in INDEXES:
+            if index_table(kind) in tables:
+                for sql in trigger_sql(kind):
+                    cursor.execute(sql)
+
+
+def rebuild(connection, kinds=None):
+    """Refill the index tables from the model tables"""
+    with connection.cursor() as cursor:
+        for kind in kinds or INDEXES:
+            spec = INDEXES[kind]
+            table, fts = spec["model"]._meta.db_table, index_table(kind)
+            cursor.execute(f"DELETE FROM {fts}")
+            cursor.execute(f"INSERT INTO {fts}(rowid, body, owner) "
+                           f"SELECT id, {spec['column']}, {spec['owner'].format(row=table)} FROM {table}")
+
+
+def match_expression(text, user_id=None):
+    """
+    FTS5 query for free text: every word has to appear in `body`, the last
+    one as a prefix so results follow typing (only that one: expanding a
+    common prefix means reading every matching term's row list). Anything
+    but letters and digits is dropped, so FTS5 operators can't be
+    injected. None when no word is left
+    """
+    terms = TERM.findall(text.lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    phrases = [f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*']
+    expression = "body : (" + " AND ".join(phrases) + ")"
+    if user_id is not None:
+        expression = f'owner : "u{user_id}" AND {expression}'
+    return expression
+
+
+def matching_ids(kind, text):
+    """
+    Subquery of primary keys whose text matches, for .filter(pk__in=...).
+    None when the index can't answer (no words, or not on SQLite)
+    """
+    expression = match_expression(text)
+    if expression is None or not is_available():
+        return None
+    fts = index_table(kind)
+    return RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", [expression])
+
+
+def owned(kind, user):
+    """The user's rows of one kind"""
+    if kind == "items":
+        return ShoppingListItem.objects.filter(user=user)
+    return Transaction.objects.filter(finance_profile=FinanceProfile.for_user(user, create=False))
+
+
+def ranked_ids(user, text, kinds, offset, limit):
+    """[(kind, pk, score)] best first; scores are bm25, lower is better"""
+    if not is_available():
+        # Unranked fallback, newest first
+        words = TERM.findall(text.lower())[:MAX_TERMS]
+        if not words:
+            return []
+        rows = []
+        for kind in kinds:
+            queryset = owned(kind, user)
+            for word in words:
+                queryset = queryset.filter(**{f"{INDEXES[kind]['column']}__icontains": word})
+            rows += [(kind, pk, None) for pk in queryset.order_by("-pk").values_list("pk", flat=True)[:offset + limit]]
+        return sorted(rows, key=lambda row: -row[1])[offset:offset + limit]
+
+    expression = match_expression(text, user.pk)
+    if expression is None:
+        return []
+    selects, params = [], []
+    for kind in kinds:
+        fts = index_table(kind)
+        # Weight 0 for `owner`: it matches every row of the user alike
+        selects.append(f"SELECT %s, rowid, bm25({fts}, 1.0, 0.0) FROM {fts} WHERE {fts} MATCH %s")
+        params += [kind, expression]
+    sql = " UNION ALL ".join(selects) + " ORDER BY 3, 2 DESC LIMIT %s OFFSET %s"
+    with default_connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit, offset])
+        return cursor.fetchall()
+
+
+def search(user, text, kind=None, page=1, size=20):
+    """
+    One page of the user's items and transactions matching `text`, best
+    match first. Returns ([(kind, object, score)], has_next)
+    """
+    kinds = [kind] if kind else list(INDEXES)
+    rows = ranked_ids(user, text, kinds, (page - 1) * size, size + 1)
+    has_next = len(rows) > size
+    rows = rows[:size]
+
+    objects = {}
+    for kind in kinds:
+        ids = [pk for row_kind, pk, score in rows if row_kind == kind]
+        if ids:
+            # Scoped again, so a stale index row can't leak another user's data
+            objects[kind] = owned(kind, user).in_bulk(ids)
+    results = [(kind, objects[kind][pk], score) for kind, pk, score in rows if pk in objects.get(kind, {})]
+    return results, has_next
@@ -0,0 +1,66 @@
+from django.db import connections
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from . import search
+from .cache import invalidate_user
+from .models import Transaction, DailySpend, FinanceProfile, ShoppingListItem
+
+
+def deleted_with_profile(origin):
+    """
+    True when a Transaction delete cascades from its profile (or the
+    profile's user) rather than starting from the transactions themselves.
+    Transactions only hang off FinanceProfile, so any other origin means the
+    profile, its buckets and its cached pages are going too
+    """
+    if origin is None:
+        return False
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is not Transaction
+
+
+@receiver(post_delete, sender=Transaction)
+def remove_from_daily_spend(sender, instance, origin=None, **kwargs):
+    # Collector.delete() sends this inside its own atomic block, so the bucket
+    # update commits or rolls back together with the delete
+    if deleted_with_profile(origin):
+        return
+    DailySpend.record(instance, sign=-1)
+    instance.bump_ledger_version()
+
+
+# Expire the owner's cached dashboard and shopping table on every change.
+# Writes through .update() or bulk_create() don't send these signals and call
+# invalidate_user() themselves
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def transaction_changed(sender, instance, origin=None, **kwargs):
+    if deleted_with_profile(origin):
+        # finance_profile_changed() invalidates the user once for the whole ledger
+        return
+    if Transaction.finance_profile.is_cached(instance):
+        user_id = instance.finance_profile.user_id
+    else:
+        user_id = FinanceProfile.objects.filter(pk=instance.finance_profile_id).values_list("user_id", flat=True).first()
+    invalidate_user(user_id)
+
+
+@receiver(post_save, sender=ShoppingListItem)
+@receiver(post_delete, sender=ShoppingListItem)
+def shopping_item_changed(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=FinanceProfile)
+@receiver(post_delete, sender=FinanceProfile)
+def finance_profile_changed(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    # The search index triggers go away whenever a migration rebuilds their table
+    if sender.name == "widgets":
+        search.install_triggers(connections[using])
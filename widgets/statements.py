@@ -0,0 +1,201 @@
+"""
+Streaming import of bank statements (CSV) into the Transaction ledger
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from decimal import Decimal, InvalidOperation
+from .models import DailySpend, FinanceProfile, Transaction
+from .operations import clean_price_input
+import csv
+import datetime
+import hashlib
+import io
+
+# Transaction.amount holds at most 10 digits
+MAX_AMOUNT = Decimal("100000000")
+
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%m/%d/%Y", "%d %b %Y", "%d-%b-%Y"]
+
+# Header names banks commonly use for each field
+COLUMNS = {
+    "date": ["date", "transaction_date", "txn_date", "value_date", "posting_date", "booking_date"],
+    "description": ["description", "narration", "details", "particulars", "memo", "remarks"],
+    "amount": ["amount", "transaction_amount"],
+    "debit": ["debit", "withdrawal", "withdrawal_amount", "debit_amount"],
+    "credit": ["credit", "deposit", "deposit_amount", "credit_amount"],
+    "type": ["type", "transaction_type", "dr_cr", "cr_dr"],
+    "category": ["category"],
+}
+
+
+class StatementRow:
+    """A parsed statement line, ready to become a Transaction"""
+
+    def __init__(self, day, description, amount, transaction_type, category):
+        self.day = day
+        self.description = description
+        self.amount = amount
+        self.transaction_type = transaction_type
+        self.category = category
+
+    def fingerprint(self, occurrence):
+        # occurrence tells apart identical rows on the same day (two coffees)
+        raw = f"{self.day.isoformat()}|{self.amount}|{self.transaction_type}|{self.description.lower()}|{occurrence}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def parse_date(value):
+    value = value.strip()
+    if value[:4].isdigit():
+        # ISO timestamps: keep just the date
+        value = value.split(" ")[0].split("T")[0]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised date {value!r}")
+
+
+def parse_amount(value):
+    value = (value or "").strip()
+    if not value:
+        return Decimal(0)
+    negative = value.startswith("(") and value.endswith(")")
+    amount = Decimal(str(clean_price_input(value.strip("()")))).quantize(Decimal("0.01"))
+    return -amount if negative else amount
+
+
+def parse_row(row, columns, default_debit_category, default_credit_category):
+    """Turn one csv.DictReader row into a StatementRow, raises ValueError for unusable rows"""
+    def get(field):
+        return (row.get(columns[field]) or "").strip() if field in columns else ""
+
+    day = parse_date(get("date"))
+    if "debit" in columns or "credit" in columns:
+        amount = parse_amount(get("credit")) - parse_amount(get("debit"))
+    else:
+        amount = parse_amount(get("amount"))
+        kind = get("type").lower()
+        if kind in ("debit", "dr", "d") and amount > 0:
+            amount = -amount
+    if amount == 0 or abs(amount) >= MAX_AMOUNT:
+        raise ValueError(f"unusable amount {amount}")
+
+    transaction_type = "credit" if amount > 0 else "debit"
+    category = get("category").lower()
+    if category not in dict(Transaction.CATEGORIES):
+        category = default_credit_category if transaction_type == "credit" else default_debit_category
+    description = get("description")[:255] or "Statement entry"
+    return StatementRow(day, description, abs(amount), transaction_type, category)
+
+
+def match_columns(fieldnames):
+    """Map our field names to the statement's header names"""
+    normalized = {name.strip().lower().replace(" ", "_").replace("/", "_"): name for name in fieldnames or []}
+    columns = {}
+    for field, candidates in COLUMNS.items():
+        for candidate in candidates:
+            if candidate in normalized:
+                columns[field] = normalized[candidate]
+                break
+    if "date" not in columns or not ({"amount", "debit", "credit"} & columns.keys()):
+        raise ValueError("the statement needs a date column and an amount (or debit/credit) column")
+    return columns
+
+
+def import_statement(profile, fileobj, chunk_size=4000,
+                     default_debit_category="needs", default_credit_category="savings"):
+    """
+    Stream a CSV statement into the profile's ledger.
+    Rows are read one at a time and inserted with bulk_create in chunks,
+    all inside one DB transaction. Rows already imported before (same
+    fingerprint) are skipped. The balance, ledger version and daily buckets
+    are updated once at the end.
+    fileobj must be seekable: it is read twice, first to find where each
+    day's rows end, then to import them.
+    Returns a dict of counts
+    """
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(text)
+    columns = match_columns(reader.fieldnames)
+
+    # Index of the last row of each day. Lets the import below drop a day's
+    # occurrence counters as soon as the day is done, so memory follows how
+    # far apart a day's rows are, not how many rows the file has
+    last_row = {}
+    for index, row in enumerate(reader):
+        try:
+            last_row[parse_row(row, columns, default_debit_category, default_credit_category).day] = index
+        except (ValueError, InvalidOperation):
+            pass
+    text.seek(0)
+    reader = csv.DictReader(text)
+
+    stats = {"imported": 0, "duplicates": 0, "skipped": 0}
+    net_change = Decimal(0)
+    first_day = None
+
+    # Per open day, how often each row signature has been seen so far. Counts
+    # cover all of a day's rows wherever they are in the file, so rows get
+    # the same fingerprints however the statement is sorted
+    occurrences = {}
+    chunk = []
+
+    def flush():
+        nonlocal net_change
+        hashes = [txn.import_hash for txn in chunk]
+        # isnull=False lets SQLite use the partial unique index on import_hash
+        existing = set(Transaction.objects.filter(
+            finance_profile=profile, import_hash__isnull=False, import_hash__in=hashes
+        ).order_by().values_list("import_hash", flat=True))
+        new = [txn for txn in chunk if txn.import_hash not in existing]
+        Transaction.objects.bulk_create(new)
+        for txn in new:
+            net_change += txn.amount if txn.transaction_type == "credit" else -txn.amount
+        stats["imported"] += len(new)
+        stats["duplicates"] += len(chunk) - len(new)
+        chunk.clear()
+
+    with transaction.atomic():
+        for index, row in enumerate(reader):
+            try:
+                parsed = parse_row(row, columns, default_debit_category, default_credit_category)
+            except (ValueError, InvalidOperation):
+                stats["skipped"] += 1
+                continue
+
+            seen = occurrences.setdefault(parsed.day, {})
+            key = (parsed.amount, parsed.transaction_type, parsed.description.lower())
+            seen[key] = seen.get(key, 0) + 1
+            first_day = min(first_day, parsed.day) if first_day else parsed.day
+
+            chunk.append(Transaction(
+                finance_profile=profile,
+                amount=parsed.amount,
+                transaction_type=parsed.transaction_type,
+                category=parsed.category,
+                description=parsed.description,
+                created_at=timezone.make_aware(datetime.datetime.combine(parsed.day, datetime.time(12))),
+                import_hash=parsed.fingerprint(seen[key]),
+            ))
+            if last_row[parsed.day] == index:
+                del occurrences[parsed.day]
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+
+        if stats["imported"]:
+            # bulk_create skips Transaction.save(), so apply its side effects
+            # once for the whole statement; rebuild() also bumps the ledger
+            # version and expires the user's cached pages
+            FinanceProfile.objects.filter(pk=profile.pk).update(
+                total_funds=F("total_funds") + net_change,
+                updated_at=timezone.now(),
+            )
+            DailySpend.rebuild(FinanceProfile.objects.filter(pk=profile.pk), since=first_day)
+
+    stats["net_change"] = net_change
+    return stats
@@ -1,3 +1,945 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from . import scraper
+from .analytics import rolling_mean, spending_analytics
+from .cache import cached_for_user
+from .finance import FinanceSnapshot
+from .ledger import InsufficientFunds, post_transaction, reverse_transaction
+from .models import DailySpend, DomainStrategy, FinanceProfile, ShoppingListItem, Transaction
+from .operations import (extract_price, extract_price_from_html, import_shopping_items, parse_shopping_file,
+                         refresh_item_price, requeue_stale_prices, resolve_pending_price)
+from .statements import import_statement
+import base64
+import datetime
+import io
+import numpy as np
+import tempfile
+import threading
+import time
+import tracemalloc
 
-# Create your tests here.
+# Statements whose plan is checked; inserts and savepoints have none worth reading
+PLANNED = ("SELECT", "UPDATE", "DELETE")
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN output is SQLite's")
+class QueryPlanTests(TestCase):
+    """
+    Every statement the hot views run has to be answered from an index:
+    no full SCAN of a table or index, and no temp B-tree to sort or group.
+    A failure names the view, the statement and its plan
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("planner", password="x")
+        cls.profile = FinanceProfile.objects.create(user=cls.user, total_funds=Decimal("50000"),
+                                                    monthly_income=Decimal("60000"))
+        now = timezone.now()
+        for n in range(30):
+            transaction_type = "credit" if n % 5 == 0 else "debit"
+            Transaction.objects.create(
+                finance_profile=cls.profile, amount=Decimal(100 + n), transaction_type=transaction_type,
+                category="savings" if transaction_type == "credit" else ("needs", "wants")[n % 2],
+                description=f"planned {n}", created_at=now - datetime.timedelta(days=n),
+            )
+        for n in range(10):
+            ShoppingListItem.objects.create(user=cls.user, name=f"item {n}", price=Decimal(500 + n),
+                                            priority=n % 3 == 0)
+
+    def setUp(self):
+        # Pages come from the per-user cache once built; the plans are in the build
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedPlans(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data or {})
+        self.assertLess(response.status_code, 400, f"{method.upper()} {url}")
+        for query in queries:
+            # Captured SQL has its parameters inlined with SQLite quoting
+            sql = query["sql"]
+            if not sql.lstrip().upper().startswith(PLANNED):
+                continue
+            plan = self.plan(sql)
+            bad = [step for step in plan
+                   if (step.startswith("SCAN") and step != "SCAN CONSTANT ROW") or "TEMP B-TREE" in step]
+            self.assertFalse(bad, f"{method.upper()} {url}\n{sql}\n" + "\n".join(plan))
+        return response
+
+    def test_finance_page(self):
+        self.assertIndexedPlans("get", reverse("widget:finance"))
+
+    def test_shopping_page(self):
+        self.assertIndexedPlans("get", reverse("widget:shopping"))
+
+    def test_transaction_history(self):
+        url = reverse("widget:transactions")
+        self.assertIndexedPlans("get", url)
+        self.assertIndexedPlans("get", url, {"category": "needs"})
+        self.assertIndexedPlans("get", url, {"type": "debit"})
+        self.assertIndexedPlans("get", url, {"category": "wants", "type": "debit"})
+
+    def test_transaction_history_json_pages(self):
+        url = reverse("widget:transactions_json")
+        cursor = self.assertIndexedPlans("get", url, {"size": 10}).json()["next_cursor"]
+        self.assertIndexedPlans("get", url, {"size": 10, "cursor": cursor})
+        self.assertIndexedPlans("get", url, {"size": 5, "cursor": cursor, "category": "needs", "type": "debit"})
+
+    def test_api_endpoints(self):
+        for name in ("api_shopping", "api_finance_summary", "api_finance_analytics", "api_recent_transactions"):
+            with self.subTest(name):
+                self.assertIndexedPlans("get", reverse(f"widget:{name}"))
+
+    def test_ledger_writes(self):
+        finance = reverse("widget:finance")
+        self.assertIndexedPlans("post", finance, {"action": "add_money", "amount": "250", "description": "gift",
+                                                  "category": "savings"})
+        self.assertIndexedPlans("post", finance, {"action": "deduct_money", "amount": "75",
+                                                  "description": "groceries", "category": "needs"})
+        item = ShoppingListItem.objects.filter(user=self.user).first()
+        self.assertIndexedPlans("post", reverse("widget:buy_item", args=[item.pk]))
+        transaction = Transaction.objects.filter(finance_profile=self.profile).first()
+        self.assertIndexedPlans("post", reverse("widget:remove_transaction"), {"transaction_id": transaction.pk})
+
+
+@skipUnless(connection.vendor == "sqlite", "the search index is SQLite FTS5")
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("searcher", password="x")
+        cls.other = User.objects.create_user("other", password="x")
+        cls.profile = FinanceProfile.objects.create(user=cls.user)
+        other_profile = FinanceProfile.objects.create(user=cls.other)
+        cls.groceries = Transaction.objects.create(finance_profile=cls.profile, amount=Decimal("40"),
+                                                   transaction_type="debit", category="needs",
+                                                   description="Weekly groceries at the market")
+        Transaction.objects.create(finance_profile=other_profile, amount=Decimal("10"), transaction_type="debit",
+                                   category="needs", description="Groceries")
+        cls.kettle = ShoppingListItem.objects.create(user=cls.user, name="Electric kettle", price=Decimal("900"))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def search(self, q, **params):
+        return self.client.get(reverse("widget:api_search"), {"q": q, **params}).json()
+
+    def test_results_are_scoped_to_the_user_and_follow_writes(self):
+        results = self.search("grocer")["results"]
+        self.assertEqual([(r["kind"], r["id"]) for r in results], [("transactions", self.groceries.pk)])
+
+        Transaction.objects.filter(pk=self.groceries.pk).update(description="Pharmacy")
+        self.assertEqual(self.search("grocer")["results"], [])
+        self.assertEqual(len(self.search("pharm")["results"]), 1)
+
+        ShoppingListItem.objects.filter(pk=self.kettle.pk).delete()
+        self.assertEqual(self.search("kettle")["results"], [])
+
+    def test_ranked_pages(self):
+        ShoppingListItem.objects.bulk_create([
+            ShoppingListItem(user=self.user, name=f"Kettle descaler {n}", price=Decimal("5")) for n in range(3)
+        ])
+        first = self.search("kettle", kind="items", size=2)
+        self.assertEqual(first["next_page"], 2)
+        self.assertEqual(first["results"][0]["id"], self.kettle.pk)  # shortest name ranks first
+        second = self.search("kettle", kind="items", size=2, page=2)
+        self.assertIsNone(second["next_page"])
+        self.assertEqual(len(first["results"]) + len(second["results"]), 4)
+
+    def test_query_syntax_is_plain_text(self):
+        self.assertEqual(self.search('kettle"* (')["results"][0]["id"], self.kettle.pk)
+        # Operators are just words: this asks for both, it doesn't widen the scope
+        self.assertEqual(self.search(f"owner:u{self.other.pk}")["results"], [])
+        self.assertEqual(self.search("***")["results"], [])
+
+
+class ShoppingListQueryCountTests(TestCase):
+    """Page cost doesn't grow with the number of shopping list items"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("counter", password="x")
+        FinanceProfile.objects.create(user=cls.user, total_funds=Decimal("5000"), monthly_income=Decimal("40000"))
+        Transaction.objects.create(finance_profile=cls.user.finance_profile, amount=Decimal("300"),
+                                   transaction_type="debit", category="wants", description="cinema")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def set_items(self, count):
+        ShoppingListItem.objects.filter(user=self.user).delete()
+        ShoppingListItem.objects.bulk_create([
+            ShoppingListItem(user=self.user, name=f"item {n}", price=Decimal(100 + n), priority=n % 2 == 0)
+            for n in range(count)
+        ])
+
+    def get_page(self, name):
+        # The per-user cache would hide the build, which is what's counted
+        cache.clear()
+        self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+
+    def test_query_count_is_independent_of_list_length(self):
+        for name in ("widget:shopping", "widget:finance"):
+            with self.subTest(name):
+                self.set_items(5)
+                with CaptureQueriesContext(connection) as queries:
+                    self.get_page(name)
+                self.set_items(200)
+                with self.assertNumQueries(len(queries)):
+                    self.get_page(name)
+
+
+class DailySpendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("bucketer", password="x")
+        cls.profile = FinanceProfile.objects.create(user=cls.user)
+
+    def setUp(self):
+        # Scores are cached by profile id, which other tests' rolled back rows reuse
+        cache.clear()
+
+    def assertBucketsMatchTransactions(self):
+        expected = {}
+        for txn in Transaction.objects.filter(finance_profile=self.profile):
+            key = (timezone.localdate(txn.created_at), txn.category, txn.transaction_type)
+            total, count = expected.get(key, (Decimal(0), 0))
+            expected[key] = (total + txn.amount, count + 1)
+        # Emptied buckets stay behind with zeros
+        buckets = {
+            (bucket.day, bucket.category, bucket.transaction_type): (bucket.total, bucket.count)
+            for bucket in DailySpend.objects.filter(finance_profile=self.profile) if bucket.count
+        }
+        self.assertEqual(buckets, expected)
+
+    def test_buckets_follow_creates_edits_and_deletes(self):
+        now = timezone.now()
+        txn = Transaction.objects.create(finance_profile=self.profile, amount=Decimal("120.50"),
+                                         transaction_type="debit", category="needs", description="rent")
+        Transaction.objects.create(finance_profile=self.profile, amount=Decimal("30"), transaction_type="debit",
+                                   category="needs", description="bus")
+        Transaction.objects.create(finance_profile=self.profile, amount=Decimal("900"), transaction_type="credit",
+                                   category="savings", description="salary",
+                                   created_at=now - datetime.timedelta(days=3))
+        self.assertBucketsMatchTransactions()
+
+        txn.amount = Decimal("99.99")
+        txn.save()
+        self.assertBucketsMatchTransactions()
+        txn.category = "wants"
+        txn.save()
+        self.assertBucketsMatchTransactions()
+        txn.created_at = now - datetime.timedelta(days=10)
+        txn.save()
+        self.assertBucketsMatchTransactions()
+
+        txn.delete()
+        self.assertBucketsMatchTransactions()
+        Transaction.objects.filter(finance_profile=self.profile).first().delete()
+        self.assertBucketsMatchTransactions()
+
+    def test_deleting_a_user_skips_per_transaction_work(self):
+        query_counts = []
+        for count in (10, 200):
+            user = User.objects.create_user(f"leaving-{count}", password="x")
+            profile = FinanceProfile.objects.create(user=user)
+            for n in range(count):
+                Transaction.objects.create(finance_profile=profile, amount=Decimal(n + 1), transaction_type="debit",
+                                           category="needs", description=f"row {n}")
+            with CaptureQueriesContext(connection) as queries:
+                user.delete()
+            query_counts.append(len(queries))
+            self.assertFalse(DailySpend.objects.filter(finance_profile_id=profile.pk).exists())
+        # Only the collector's batched DELETEs may grow with the ledger
+        self.assertLessEqual(query_counts[1], query_counts[0] + 2)
+
+    def test_rebuild_expires_cached_values(self):
+        Transaction.objects.create(finance_profile=self.profile, amount=Decimal("500"), transaction_type="debit",
+                                   category="needs", description="rent")
+        Transaction.objects.create(finance_profile=self.profile, amount=Decimal("500"), transaction_type="debit",
+                                   category="wants", description="trip")
+        # Buckets drifted away from the ledger, e.g. after a raw SQL fix, and
+        # a score was cached from them
+        DailySpend.objects.filter(finance_profile=self.profile, category="wants").update(total=0)
+        profile = FinanceProfile.objects.get(pk=self.profile.pk)
+        drifted = profile.financial_score
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            DailySpend.rebuild(FinanceProfile.objects.filter(pk=profile.pk))
+        self.assertTrue(callbacks)
+        self.assertBucketsMatchTransactions()
+        rebuilt = FinanceProfile.objects.get(pk=profile.pk)
+        self.assertEqual(rebuilt.ledger_version, profile.ledger_version + 1)
+        self.assertNotEqual(rebuilt.financial_score, drifted)
+
+
+class PendingPriceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("waiter", password="x")
+        cls.profile = FinanceProfile.objects.create(user=cls.user, total_funds=Decimal("1000"))
+        cls.pending = ShoppingListItem.objects.create(user=cls.user, name="Lamp", price=0, priority=True,
+                                                      link="http://shop.invalid/lamp", price_status="pending")
+        cls.priced = ShoppingListItem.objects.create(user=cls.user, name="Mug", price=Decimal("250"), priority=True)
+
+    def test_pending_items_are_not_counted_as_affordable(self):
+        snapshot = FinanceSnapshot(self.profile)
+        self.assertEqual(snapshot.affordable_items, [self.priced])
+        self.assertEqual(snapshot.items_within_funds, [self.priced])
+
+    def test_shopping_page_requeues_items_left_pending(self):
+        # Nothing in this process is fetching the item, as after a restart
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(requeue_stale_prices(self.user), 1)
+        self.assertEqual(len(callbacks), 1)
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.get(reverse("widget:shopping"))
+        self.assertContains(response, 'http-equiv="refresh"')
+        self.assertEqual(len(callbacks), 1)
+
+
+class StandInShop(BaseHTTPRequestHandler):
+    """
+    Local stand-in retailer: /product has a JSON-LD price and an ETag, /error
+    a 500, /missing a 404, /slow stalls
+    """
+
+    PRODUCT = ('<html><head><script type="application/ld+json">{"offers": {"price": "249.00"}}</script>'
+               '</head><body>Lamp</body></html>')
+    ETAG = '"lamp-1"'
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        self.server.validators.append(self.headers.get("If-None-Match"))
+        path = self.path.split("?")[0]
+        if path == "/slow":
+            # Past the client's timeout, which has hung up by then
+            time.sleep(0.5)
+            return
+        if self.headers.get("If-None-Match") == self.ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        status = {"/error": 500, "/missing": 404}.get(path, 200)
+        body = self.PRODUCT.encode()
+        self.send_response(status)
+        self.send_header("ETag", self.ETAG)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(SCRAPER_TIMEOUT=0.2)
+class StandInShopTestCase(TestCase):
+    """Runs StandInShop on a thread, with a fresh breaker and price cache and a manual clock per test"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInShop)
+        cls.server.daemon_threads = True
+        cls.server.paths = []
+        cls.server.validators = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.paths.clear()
+        self.server.validators.clear()
+        self.now = 1000.0
+        # Time only moves when a test says so
+        clock = mock.patch.object(scraper, "time", SimpleNamespace(monotonic=lambda: self.now))
+        clock.start()
+        self.addCleanup(clock.stop)
+        for name, value in (("breaker", scraper.CircuitBreaker(threshold=3, reset_timeout=60)),
+                            ("price_cache", scraper.TTLCache(maxsize=8, ttl=30))):
+            patcher = mock.patch.object(scraper, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class ScraperTests(StandInShopTestCase):
+    def test_cache_entries_expire_after_ttl(self):
+        cache = scraper.TTLCache(ttl=30)
+        cache.set("key", "249.00")
+        self.now += 29
+        self.assertEqual(cache.get("key"), "249.00")
+        self.now += 2
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(len(cache), 0)
+
+    def test_tracking_params_share_a_cache_entry(self):
+        self.assertEqual(extract_price(f"{self.base}/product?id=7&utm_source=mail&ref=home"), "249.00")
+        self.assertEqual(extract_price(f"{self.base}/product?gclid=x&id=7"), "249.00")
+        self.assertEqual(len(self.server.paths), 1)
+        # A different product is a different entry
+        extract_price(f"{self.base}/product?id=8")
+        self.assertEqual(len(self.server.paths), 2)
+        # And the entry is fetched again once it expires
+        self.now += 31
+        extract_price(f"{self.base}/product?id=7")
+        self.assertEqual(len(self.server.paths), 3)
+
+    def test_breaker_opens_fails_fast_and_closes_after_a_trial(self):
+        domain = scraper.domain_of(self.base)
+        with self.assertLogs(scraper.logger, "WARNING"):
+            for _ in range(3):
+                self.assertEqual(scraper.get(f"{self.base}/error").status_code, 500)
+        self.assertTrue(scraper.breaker.is_open(domain))
+
+        # Open: nothing reaches the server
+        self.assertIsNone(scraper.get(f"{self.base}/product"))
+        self.assertEqual(len(self.server.paths), 3)
+
+        # Half-open after the reset timeout: one trial, the rest still wait
+        self.now += 60
+        self.assertTrue(scraper.breaker.allow(domain))
+        self.assertFalse(scraper.breaker.allow(domain))
+        # That trial never reported back; the next one goes out after another
+        # timeout and its success closes the circuit
+        self.now += 60
+        self.assertEqual(scraper.get(f"{self.base}/product").status_code, 200)
+        self.assertFalse(scraper.breaker.is_open(domain))
+        self.assertEqual(scraper.get(f"{self.base}/product").status_code, 200)
+
+    def test_failed_trial_reopens_the_breaker(self):
+        domain = scraper.domain_of(self.base)
+        with self.assertLogs(scraper.logger, "WARNING"):
+            for _ in range(3):
+                scraper.get(f"{self.base}/error")
+        self.now += 60
+        scraper.get(f"{self.base}/error")
+        self.assertTrue(scraper.breaker.is_open(domain))
+        self.assertIsNone(scraper.get(f"{self.base}/product"))
+
+    def test_timeouts_count_as_failures_and_client_errors_do_not(self):
+        domain = scraper.domain_of(self.base)
+        for _ in range(5):
+            self.assertEqual(scraper.get(f"{self.base}/missing").status_code, 404)
+        self.assertFalse(scraper.breaker.is_open(domain))
+
+        with self.assertLogs(scraper.logger, "WARNING"):
+            for _ in range(3):
+                self.assertIsNone(scraper.get(f"{self.base}/slow"))
+        self.assertTrue(scraper.breaker.is_open(domain))
+
+
+class PriceStrategyTests(TestCase):
+    PAGE = ('<html><head><script type="application/ld+json">{"offers": {"price": "249.00"}}</script></head>'
+            '<body><div class="banner">Free shipping over $35</div><h1>Desk lamp</h1></body></html>')
+
+    def test_structured_data_wins_over_a_learned_text_strategy(self):
+        self.assertEqual(extract_price_from_html(self.PAGE, domain="fresh.example"), "249.00")
+
+        DomainStrategy.objects.create(domain="shop.example", strategy="text")
+        self.assertEqual(extract_price_from_html(self.PAGE, domain="shop.example"), "249.00")
+        learned = DomainStrategy.objects.get(domain="shop.example")
+        self.assertEqual((learned.strategy, learned.locator), ("jsonld", "offers/price"))
+
+        # The next page from the domain counts as a hit for the relearned path
+        extract_price_from_html(self.PAGE, domain="shop.example")
+        self.assertEqual(DomainStrategy.objects.get(domain="shop.example").hits, 1)
+
+    def test_text_is_only_learned_without_structured_data(self):
+        page = "<html><head></head><body><p>Now only $19.99</p></body></html>"
+        self.assertEqual(extract_price_from_html(page, domain="plain.example"), "$19.99")
+        self.assertEqual(DomainStrategy.objects.get(domain="plain.example").strategy, "text")
+
+        with_meta = ('<html><head><meta property="og:price:amount" content="18.50"></head>'
+                     '<body><p>Now only $19.99</p></body></html>')
+        self.assertEqual(extract_price_from_html(with_meta, domain="plain.example"), "18.50")
+        self.assertEqual(DomainStrategy.objects.get(domain="plain.example").strategy, "meta")
+
+
+class PriceRefreshTests(StandInShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("refresher", password="x")
+        self.item = ShoppingListItem.objects.create(user=self.user, name="Lamp", price=0, price_status="pending",
+                                                    link=f"{self.base}/product")
+
+    def test_first_fetch_stores_validators_for_the_first_refresh(self):
+        resolve_pending_price(self.item.pk)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.price, self.item.etag), (Decimal("249.00"), StandInShop.ETAG))
+        self.assertIsNotNone(self.item.price_checked_at)
+
+        self.assertFalse(refresh_item_price(self.item.pk))
+        self.assertEqual(self.server.validators, [None, StandInShop.ETAG])
+
+    def test_refresh_leaves_a_price_typed_in_by_hand(self):
+        resolve_pending_price(self.item.pk)
+        self.client.force_login(self.user)
+        self.client.post(reverse("widget:edit_item", args=[self.item.pk]), {
+            "item-name": "Lamp", "item-link": self.item.link, "item-price": "199", "item-priority": "want",
+        })
+        # Without validators a fetch would see the shop's 249.00 again
+        ShoppingListItem.objects.filter(pk=self.item.pk).update(etag="")
+
+        self.assertFalse(refresh_item_price(self.item.pk))
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.price, self.item.manual_price), (Decimal("199.00"), True))
+        self.assertEqual(len(self.server.paths), 1)
+        self.assertFalse(self.item.price_history.exists())
+
+
+class StatementImportTests(TestCase):
+    STATEMENT = (
+        "Date,Narration,Withdrawal,Deposit\n"
+        "02/03/2024,Coffee,40.00,\n"
+        "01/03/2024,Salary,,\"50,000.00\"\n"
+        "02/03/2024,Coffee,40.00,\n"
+        "01/03/2024,Rent,15000.00,\n"
+        "02/03/2024,Coffee,40.00,\n"
+        "not a date,Broken,1.00,\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("importer", password="x")
+        cls.profile = FinanceProfile.objects.create(user=cls.user)
+
+    def import_text(self, text):
+        return import_statement(self.profile, io.BytesIO(text.encode()))
+
+    def test_reimport_inserts_nothing_and_keeps_same_day_duplicates(self):
+        stats = self.import_text(self.STATEMENT)
+        self.assertEqual((stats["imported"], stats["duplicates"], stats["skipped"]), (5, 0, 1))
+        self.assertEqual(Transaction.objects.filter(finance_profile=self.profile, description="Coffee").count(), 3)
+        self.assertEqual(stats["net_change"], Decimal("34880.00"))
+
+        stats = self.import_text(self.STATEMENT)
+        self.assertEqual((stats["imported"], stats["duplicates"]), (0, 5))
+        self.assertEqual(Transaction.objects.filter(finance_profile=self.profile).count(), 5)
+
+    def test_row_order_does_not_change_fingerprints(self):
+        self.import_text(self.STATEMENT)
+        header, *rows = self.STATEMENT.splitlines()
+        reordered = "\n".join([header] + sorted(rows, reverse=True)) + "\n"
+        self.assertEqual(self.import_text(reordered)["imported"], 0)
+
+        # A fourth coffee that day is new
+        stats = self.import_text(self.STATEMENT + "02/03/2024,Coffee,40.00,\n")
+        self.assertEqual((stats["imported"], stats["duplicates"]), (1, 5))
+
+    def test_peak_memory_does_not_grow_with_row_count(self):
+        def statement(rows):
+            # 50 rows a day, every one different, days written out of order in pairs
+            yield "Date,Narration,Withdrawal,Deposit\n"
+            start = datetime.date(2020, 1, 1)
+            for n in range(rows):
+                day = start + datetime.timedelta(days=n // 100 * 2 + n % 2)
+                yield f"{day:%d/%m/%Y},Shop {n},{n % 500}.25,\n"
+
+        peaks = []
+        for rows in (2000, 10000):
+            data = io.BytesIO("".join(statement(rows)).encode())
+            profile = FinanceProfile.objects.create(user=User.objects.create_user(f"importer-{rows}"))
+            tracemalloc.start()
+            try:
+                stats = import_statement(profile, data, chunk_size=1000)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+            self.assertEqual(stats["imported"], rows)
+        self.assertLess(peaks[1], peaks[0] * 1.25)
+
+
+class LedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("ledger", password="x")
+        cls.profile = FinanceProfile.objects.create(user=cls.user, total_funds=Decimal("100.00"))
+
+    def balance(self):
+        return FinanceProfile.objects.get(pk=self.profile.pk).total_funds
+
+    def test_insufficient_funds_writes_nothing(self):
+        version = FinanceProfile.objects.get(pk=self.profile.pk).ledger_version
+        with self.assertRaises(InsufficientFunds) as raised:
+            post_transaction(self.profile, Decimal("150.00"), "debit", "wants", "headphones")
+        self.assertEqual(raised.exception.shortage, Decimal("50.00"))
+        self.assertEqual(self.balance(), Decimal("100.00"))
+        self.assertFalse(Transaction.objects.filter(finance_profile=self.profile).exists())
+        self.assertFalse(DailySpend.objects.filter(finance_profile=self.profile).exists())
+        self.assertEqual(FinanceProfile.objects.get(pk=self.profile.pk).ledger_version, version)
+
+    def test_reverse_restores_the_balance(self):
+        debit = post_transaction(self.profile, Decimal("60.00"), "debit", "needs", "groceries")
+        credit = post_transaction(self.profile, Decimal("25.50"), "credit", "savings", "refund")
+        self.assertEqual(self.balance(), Decimal("65.50"))
+
+        # Another request's copy of the same row
+        stale = Transaction.objects.get(pk=debit.pk)
+        reverse_transaction(debit)
+        self.assertEqual(self.balance(), Decimal("125.50"))
+        reverse_transaction(credit)
+        self.assertEqual(self.balance(), Decimal("100.00"))
+        self.assertFalse(Transaction.objects.filter(finance_profile=self.profile).exists())
+
+        # Reversing it again from that copy changes nothing
+        with self.assertRaises(Transaction.DoesNotExist):
+            reverse_transaction(stale)
+        self.assertEqual(self.balance(), Decimal("100.00"))
+
+
+class BuildIdTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("deployer", password="x")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_a_new_release_changes_page_etags_and_fragment_keys(self):
+        url = reverse("widget:shopping")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        builds = []
+        with override_settings(RELEASE="next"):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+            cached_for_user(self.user.pk, "fragment", lambda: builds.append("next"))
+        cached_for_user(self.user.pk, "fragment", lambda: builds.append("current"))
+        self.assertEqual(builds, ["next", "current"])
+
+
+class SessionBackendTests(TestCase):
+    def test_sessions_from_the_stock_backend_still_load(self):
+        user = User.objects.create_user("returning", password="x")
+        self.client.force_login(user, backend="django.contrib.auth.backends.ModelBackend")
+        self.assertEqual(self.client.get(reverse("widget:shopping")).status_code, 200)
+        self.assertEqual(self.client.get(reverse("widget:api_shopping")).status_code, 200)
+
+
+class ShoppingImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("shopper", password="x")
+        FinanceProfile.objects.create(user=cls.user, total_funds=Decimal("1000"))
+
+    def items(self):
+        return ShoppingListItem.objects.filter(user=self.user).order_by("id")
+
+    def import_rows(self, text, filename):
+        return import_shopping_items(self.user, parse_shopping_file(io.BytesIO(text.encode()), filename))
+
+    def test_csv_header_aliases_and_skipped_rows(self):
+        created, skipped, pending_ids = self.import_rows(
+            "Item Name,URL,Item Price,Type\n"
+            "Kettle,,\"1,299.50\",need\n"
+            "Lamp,http://shop.invalid/lamp,,want\n"
+            ",http://shop.invalid/nameless,10,want\n"
+            "Yacht,,\"12,345,678,901\",want\n"
+            "Refund,,-20,want\n",
+            "list.csv",
+        )
+        self.assertEqual((created, skipped), (2, 3))
+        kettle, lamp = self.items()
+        self.assertEqual((kettle.name, kettle.price, kettle.priority, kettle.price_status),
+                         ("Kettle", Decimal("1299.50"), True, "ready"))
+        self.assertEqual((lamp.link, lamp.price_status), ("http://shop.invalid/lamp", "pending"))
+        self.assertEqual(pending_ids, [lamp.pk])
+
+    def test_json_lines_and_json_documents(self):
+        created, skipped, _ = self.import_rows(
+            '{"name": "Mug", "price": "250", "priority": "yes"}\n\n["not", "a", "row"]\n{"item-name": "Tea", "price": 90}\n',
+            "list.jsonl",
+        )
+        self.assertEqual((created, skipped), (2, 1))
+        self.assertEqual([(item.name, item.price, item.priority) for item in self.items()],
+                         [("Mug", Decimal("250.00"), True), ("Tea", Decimal("90.00"), False)])
+
+        self.assertEqual(self.import_rows('{"items": [{"name": "Pot", "price": 40}]}', "list.json")[:2], (1, 0))
+        for payload in ("42", '{"items": 5}'):
+            with self.subTest(payload), self.assertRaisesMessage(ValueError, "expected a list of items"):
+                self.import_rows(payload, "list.json")
+
+    def test_upload_of_a_mixed_file_leaves_the_pages_working(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile("list.csv", b"name,price\nKettle,1299\nYacht,\"12,345,678,901\"\nNaN price,nan\n")
+        response = self.client.post(reverse("widget:import_shopping"), {"import-file": upload})
+        self.assertRedirects(response, reverse("widget:shopping"), fetch_redirect_response=False)
+        self.assertEqual([item.name for item in self.items()], ["Kettle"])
+        self.assertContains(self.client.get(reverse("widget:shopping")), "Kettle")
+        self.assertEqual(self.client.get(reverse("widget:finance")).status_code, 200)
+
+        bad = SimpleUploadedFile("list.json", b"42")
+        response = self.client.post(reverse("widget:import_shopping"), {"import-file": bad})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("expected a list of items", str(list(get_messages(response.wsgi_request))[-1]))
+
+    def test_command(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        listing, broken = Path(directory.name) / "list.csv", Path(directory.name) / "broken.json"
+        listing.write_text("name,link,price\nKettle,,1299\nLamp,http://shop.invalid/lamp,\n")
+        broken.write_text("42")
+
+        out = io.StringIO()
+        call_command("import_shopping_list", "shopper", str(listing), "--no-fetch", stdout=out)
+        self.assertIn("Imported 2 items, skipped 0 rows", out.getvalue())
+        self.assertEqual(self.items().filter(price_status="pending").count(), 1)
+        with self.assertRaisesMessage(CommandError, "expected a list of items"):
+            call_command("import_shopping_list", "shopper", str(broken), stdout=out)
+
+
+class TransactionHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("historian", password="x")
+        cls.profile = FinanceProfile.objects.create(user=cls.user)
+        # Runs of rows sharing created_at, so pages have to break ties on id
+        start = timezone.now() - datetime.timedelta(days=10)
+        Transaction.objects.bulk_create([
+            Transaction(finance_profile=cls.profile, amount=Decimal(n + 1),
+                        transaction_type="credit" if n % 4 == 0 else "debit",
+                        category=("needs", "wants")[n % 2], description=f"row {n}",
+                        created_at=start + datetime.timedelta(hours=n // 5))
+            for n in range(47)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def walk(self, **filters):
+        url, ids, cursor = reverse("widget:transactions_json"), [], None
+        while True:
+            params = {"size": 4, **filters, **({"cursor": cursor} if cursor else {})}
+            page = self.client.get(url, params).json()
+            ids += [row["id"] for row in page["results"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return ids
+
+    def test_pages_cover_every_row_once_across_ties(self):
+        for filters in ({}, {"category": "wants"}, {"type": "debit"}, {"category": "needs", "type": "debit"}):
+            with self.subTest(**filters):
+                expected = Transaction.objects.filter(finance_profile=self.profile)
+                if "category" in filters:
+                    expected = expected.filter(category=filters["category"])
+                if "type" in filters:
+                    expected = expected.filter(transaction_type=filters["type"])
+                self.assertEqual(self.walk(**filters),
+                                 list(expected.order_by("-created_at", "-id").values_list("id", flat=True)))
+
+    def test_bad_parameters_get_fixed_messages(self):
+        url = reverse("widget:transactions_json")
+        impossible = base64.urlsafe_b64encode(b"2024-13-01T00:00:00+00:00|5").decode()
+        for params, message in (({"size": "abc"}, "size must be a number"),
+                                ({"cursor": "%%%"}, "invalid cursor"),
+                                ({"cursor": impossible}, "invalid cursor"),
+                                ({"cursor": base64.urlsafe_b64encode(b"2024-01-01|x").decode()}, "invalid cursor")):
+            with self.subTest(**params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": message})
+
+
+class ApiTests(TestCase):
+    URLS = ("widget:api_shopping", "widget:api_finance_summary", "widget:api_finance_analytics",
+            "widget:api_recent_transactions")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("poller", password="x")
+        cls.profile = FinanceProfile.objects.create(user=cls.user, total_funds=Decimal("500.00"),
+                                                    monthly_income=Decimal("3000.00"))
+        cls.item = ShoppingListItem.objects.create(user=cls.user, name="Kettle", price=Decimal("40.00"))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_unchanged_data_is_answered_with_304_before_any_aggregate(self):
+        for name in self.URLS:
+            with self.subTest(name):
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("private", response["Cache-Control"])
+                # Only the session's user lookup
+                with self.assertNumQueries(1):
+                    response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(response.status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        url = reverse("widget:api_finance_summary")
+        first = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            post_transaction(self.profile, Decimal("25.00"), "debit", "needs", "groceries")
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        self.assertEqual(second.json()["total_funds"], "475.00")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("widget:edit_item", args=[self.item.pk]), {
+                "item-name": "Kettle", "item-link": "", "item-price": "35", "item-priority": "want",
+            })
+        third = self.client.get(reverse("widget:api_shopping"), HTTP_IF_NONE_MATCH=second["ETag"])
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third["ETag"], second["ETag"])
+        self.assertEqual(third.json()["items"][0]["price"], "35.00")
+
+    def test_anonymous_get_401_and_post_405(self):
+        for name in self.URLS:
+            with self.subTest(name):
+                self.assertEqual(self.client.post(reverse(name)).status_code, 405)
+        self.client.logout()
+        for name in self.URLS:
+            with self.subTest(name):
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response.json(), {"error": "authentication required"})
+
+
+class CachedPageTests(TestCase):
+    """Writes that skip the model signals still expire the cached fragments"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("cached", password="x")
+        cls.profile = FinanceProfile.objects.create(user=cls.user, total_funds=Decimal("1000.00"),
+                                                    monthly_income=Decimal("3000.00"))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_resolved_price_rebuilds_the_shopping_table(self):
+        item = ShoppingListItem.objects.create(user=self.user, name="Lamp", price=0,
+                                               link="http://shop.invalid/lamp", price_status="pending")
+        self.assertNotContains(self.client.get(reverse("widget:shopping")), "249.00")
+        with mock.patch("widgets.operations.fetch_price", return_value=("249.00", {})), \
+                self.captureOnCommitCallbacks(execute=True):
+            resolve_pending_price(item.pk)
+        self.assertContains(self.client.get(reverse("widget:shopping")), "249.00")
+
+    def test_imported_items_rebuild_the_shopping_table(self):
+        self.assertNotContains(self.client.get(reverse("widget:shopping")), "Teapot")
+        with self.captureOnCommitCallbacks(execute=True):
+            import_shopping_items(self.user, [{"name": "Teapot", "price": "30"}])
+        self.assertContains(self.client.get(reverse("widget:shopping")), "Teapot")
+
+    def test_imported_statement_rebuilds_the_dashboard(self):
+        self.assertNotContains(self.client.get(reverse("widget:finance")), "Bakery")
+        statement = f"Date,Narration,Withdrawal,Deposit\n{timezone.localdate():%d/%m/%Y},Bakery,12.00,\n"
+        with self.captureOnCommitCallbacks(execute=True):
+            import_statement(self.profile, io.BytesIO(statement.encode()))
+        self.assertContains(self.client.get(reverse("widget:finance")), "Bakery")
+
+    def test_unchanged_fragment_costs_one_cache_read(self):
+        build = mock.Mock(return_value={"total": 1})
+        cached_for_user(self.user.pk, "dashboard", build)
+        with mock.patch("widgets.cache.cache", wraps=cache) as spy:
+            self.assertEqual(cached_for_user(self.user.pk, "dashboard", build), {"total": 1})
+        self.assertEqual([call[0] for call in spy.method_calls], ["get_many"])
+        build.assert_called_once()
+
+
+class SpendingAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user("analyst", password="x")
+        cls.profile = FinanceProfile.objects.create(user=user, total_funds=Decimal("1000.00"),
+                                                    monthly_income=Decimal("3000.00"))
+        other = FinanceProfile.objects.create(user=User.objects.create_user("bystander", password="x"))
+        buckets = [
+            (cls.profile, "2023-11-01", "needs", "debit", "999.00"),  # before the window
+            (cls.profile, "2024-02-29", "wants", "debit", "1800.00"),
+            (cls.profile, "2024-03-04", "needs", "debit", "140.00"),
+            (cls.profile, "2024-03-05", "savings", "credit", "600.00"),
+            (cls.profile, "2024-03-10", "needs", "debit", "70.00"),
+            (cls.profile, "2024-03-12", "needs", "debit", "5.00"),  # after today
+            (other, "2024-03-10", "needs", "debit", "500.00"),
+        ]
+        DailySpend.objects.bulk_create([
+            DailySpend(finance_profile=profile, day=datetime.date.fromisoformat(day), category=category,
+                       transaction_type=kind, total=Decimal(total), count=1)
+            for profile, day, category, kind, total in buckets
+        ])
+
+    def test_rolling_mean_averages_what_the_first_days_have(self):
+        self.assertEqual(rolling_mean(np.array([3.0, 0.0, 0.0, 6.0, 9.0]), 3).tolist(), [3.0, 1.5, 1.0, 2.0, 5.0])
+
+    def test_series_rates_and_projection(self):
+        analytics = spending_analytics(self.profile, today=datetime.date(2024, 3, 10))
+        self.assertEqual((analytics["start"], analytics["end"]), ("2023-12-12", "2024-03-10"))
+        self.assertEqual(len(analytics["days"]), 90)
+        self.assertEqual(analytics["days"][-11:-9], ["2024-02-29", "2024-03-01"])
+
+        # The last 11 days, 2024-02-29 to 2024-03-10
+        self.assertEqual(analytics["daily"]["needs"][-11:], [0, 0, 0, 0, 140, 0, 0, 0, 0, 0, 70])
+        self.assertEqual(analytics["daily"]["wants"][-11:], [1800] + [0] * 10)
+        self.assertEqual(analytics["daily"]["income"][-11:], [0] * 5 + [600] + [0] * 5)
+        self.assertEqual(sum(analytics["daily"]["needs"]), 210)
+
+        rolling = analytics["rolling"]
+        self.assertEqual(rolling["window_days"], 7)
+        self.assertEqual(rolling["needs"][-2:], [20.0, 30.0])
+        self.assertEqual(rolling["wants"][-5:-3], [257.14, 0.0])
+
+        self.assertEqual(analytics["burn_rate"],
+                         {"window_days": 30, "total": 67.0, "needs": 7.0, "wants": 60.0, "savings": 0.0})
+        self.assertEqual(analytics["runway_days"], 14)
+
+        month = analytics["month"]
+        self.assertEqual((month["days_elapsed"], month["days_remaining"]), (10, 21))
+        self.assertEqual(month["categories"], {
+            # 210 so far plus 7 a day for 21 days
+            "needs": {"type": "debit", "month_to_date": 210.0, "projected": 357.0, "budget": 1500.0,
+                      "on_track": True},
+            # February's spending sets the rate but isn't part of March
+            "wants": {"type": "debit", "month_to_date": 0.0, "projected": 1260.0, "budget": 900.0,
+                      "on_track": False},
+            "savings": {"type": "credit", "month_to_date": 600.0, "projected": 1020.0, "budget": 600.0,
+                        "on_track": True},
+        })
+        self.assertEqual((month["projected_spend"], month["spending_budget"]), (1617.0, 2400.0))
+
+    def test_month_boundary(self):
+        month = spending_analytics(self.profile, today=datetime.date(2024, 2, 29))["month"]
+        self.assertEqual((month["days_elapsed"], month["days_remaining"]), (29, 0))
+        self.assertEqual(month["categories"]["wants"]["projected"], 1800.0)
+        self.assertFalse(month["categories"]["wants"]["on_track"])
+        self.assertFalse(month["categories"]["savings"]["on_track"])
+
+        month = spending_analytics(self.profile, today=datetime.date(2024, 3, 1))["month"]
+        self.assertEqual((month["days_elapsed"], month["days_remaining"]), (1, 30))
+        self.assertEqual(month["categories"]["wants"]["month_to_date"], 0.0)
+        self.assertEqual(month["categories"]["wants"]["projected"], 1800.0)
+
+    def test_no_income_or_spending(self):
+        profile = FinanceProfile.objects.create(user=User.objects.create_user("idle", password="x"))
+        analytics = spending_analytics(profile, today=datetime.date(2024, 3, 10))
+        self.assertIsNone(analytics["runway_days"])
+        self.assertEqual({category["on_track"] for category in analytics["month"]["categories"].values()}, {None})
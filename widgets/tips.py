@@ -0,0 +1,64 @@
+from decimal import Decimal
+
+# Each rule takes a FinanceSnapshot and returns a tip or None. Rules only read
+# the snapshot, so adding one never adds a query.
+
+
+def spending_pattern_tip(snapshot):
+    if snapshot.monthly_income > 0 and snapshot.financial_score < 60:
+        return "💡 Your spending patterns could improve. Try the 50/30/20 rule: 50% needs, 30% wants, 20% savings."
+
+
+def wants_spending_tip(snapshot):
+    if snapshot.monthly_income > 0 and snapshot.wants_spent > snapshot.monthly_income * Decimal('0.4'):
+        return "⚠️ Your entertainment/luxury spending is high. Consider reducing wants to improve financial health."
+
+
+def savings_rate_tip(snapshot):
+    if snapshot.monthly_income > 0 and snapshot.total_savings < snapshot.monthly_income * Decimal('0.15'):
+        return "💰 Try to save at least 15% of your income for emergencies and future goals."
+
+
+def monthly_income_tip(snapshot):
+    if snapshot.monthly_income <= 0:
+        return "📊 Set your monthly income in the finance settings for personalized budget advice!"
+
+
+def emergency_fund_tip(snapshot):
+    if snapshot.total_funds < (snapshot.monthly_income if snapshot.monthly_income > 0 else 10000):
+        return "🏦 Build an emergency fund for unexpected expenses and financial security."
+
+
+def shopping_funds_tip(snapshot):
+    if snapshot.items_within_funds:
+        return f"🛒 You have funds to buy {len(snapshot.items_within_funds)} items from your shopping list!"
+
+
+def essential_items_tip(snapshot):
+    affordable_needs = [item for item in snapshot.items_within_funds if item.priority]
+    if affordable_needs:
+        return f"⚡ Focus on your {len(affordable_needs)} affordable essential items first!"
+
+
+TIP_RULES = [
+    spending_pattern_tip,
+    wants_spending_tip,
+    savings_rate_tip,
+    monthly_income_tip,
+    emergency_fund_tip,
+    shopping_funds_tip,
+    essential_items_tip,
+]
+
+DEFAULT_TIPS = [
+    "🎉 Great job! Your financial habits look healthy. Keep up the good work!",
+    "📈 Consider investing your savings for long-term wealth building.",
+]
+
+
+def get_smart_tips(snapshot, rules=TIP_RULES, limit=4):
+    """Generate smart financial tips based on user's spending patterns"""
+    tips = [tip for tip in (rule(snapshot) for rule in rules) if tip]
+    if not tips:
+        tips = list(DEFAULT_TIPS)
+    return tips[:limit]
@@ -6,10 +6,19 @@ app_name = "widget"
 urlpatterns = [
     path("", views.home, name="home"),
     path("shopping-list", views.shopping_list, name="shopping"),
+    path("shopping-list/import", views.import_shopping_list, name="import_shopping"),
     path("shopping-list/edit/<int:item_id>", views.edit_item, name="edit_item"),
     path("shopping-list/delete/<int:item_id>", views.delete_item, name="delete_item"),
     path("shopping-list/buy/<int:item_id>", views.buy_item, name="buy_item"),
     path("shopping-list/remove/<int:item_id>", views.remove_item, name="remove_item"),
     path("finance",views.finance_view,name="finance"),
-    path("finance/remove-transaction", views.remove_transaction, name="remove_transaction")
+    path("finance/transactions", views.transaction_history, name="transactions"),
+    path("finance/transactions.json", views.transaction_history_json, name="transactions_json"),
+    path("finance/import-statement", views.import_bank_statement, name="import_statement"),
+    path("finance/remove-transaction", views.remove_transaction, name="remove_transaction"),
+    path("api/shopping-list", views.shopping_list_api, name="api_shopping"),
+    path("api/finance/summary", views.finance_summary_api, name="api_finance_summary"),
+    path("api/finance/analytics", views.finance_analytics_api, name="api_finance_analytics"),
+    path("api/finance/transactions/recent", views.recent_transactions_api, name="api_recent_transactions"),
+    path("api/search", views.search_api, name="api_search"),
 ]
@@ -1,9 +1,14 @@
 from .models import ShoppingListItem, finance, FinanceProfile, Transaction
 from django.shortcuts import get_object_or_404, render, redirect
+from django.template.loader import render_to_string
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+from django.http import JsonResponse
 from django.contrib import messages
-from django.db.models import Sum
+from django.db import transaction
 from decimal import Decimal, InvalidOperation
-import datetime
+from functools import wraps
+import csv
 
 def edit_item(request, item_id):
     item = get_object_or_404(ShoppingListItem, id=item_id, user=request.user)
@@ -13,7 +18,13 @@ def edit_item(request, item_id):
         
         # Clean the price input using helper function
         raw_price = request.POST.get("item-price")
-        item.price = clean_price_input(raw_price)
+        price = Decimal(str(clean_price_input(raw_price))).quantize(Decimal("0.01"))
+        if price != item.price or item.price_status != 'ready':
+            # From now on this is the user's price, not the retailer's
+            item.manual_price = True
+        item.price = price
+        item.price_status = 'ready'
+        item.previous_price = None
             
         item.priority = request.POST.get("item-priority") == "need"
         item.save()
@@ -34,54 +45,33 @@ def buy_item(request, item_id):
     item = get_object_or_404(ShoppingListItem, id=item_id, user=request.user)
     
     if request.method == "POST":
-        # Get or create finance profile
-        profile, created = FinanceProfile.objects.get_or_create(user=request.user)
+        profile = request.finance_profile
         
-        # Check if user has enough total funds
-        if profile.total_funds >= item.price:
-            # Create transaction
-            category = 'needs' if item.priority else 'wants'
-            Transaction.objects.create(
-                finance_profile=profile,
-                amount=item.price,
-                transaction_type='debit',
-                category=category,
-                description=f"Purchased: {item.name}"
-            )
-            
-            # Update total funds
-            profile.total_funds -= item.price
-            profile.save()
+        # Pay and remove the item in one go; the funds check happens in the
+        # same UPDATE that deducts the price
+        try:
+            txn = purchase_item(profile, item)
+        except InsufficientFunds as e:
+            messages.error(request, f"❌ You need ₹{e.shortage:.2f} more to buy this item. Current balance: ₹{e.balance}")
+        except ShoppingListItem.DoesNotExist:
+            messages.info(request, f"'{item.name}' was already bought.")
+        else:
+            category = txn.category
             
             # Check if this puts them over budget and give friendly warning
             if profile.monthly_income > 0:
                 budget = profile.budget_allocation
-                import datetime
-                thirty_days_ago = datetime.datetime.now() - datetime.timedelta(days=30)
-                spent_this_month = Transaction.objects.filter(
-                    finance_profile=profile,
-                    category=category,
-                    transaction_type='debit',
-                    created_at__gte=thirty_days_ago
-                ).aggregate(total=Sum('amount'))['total'] or 0
+                spent_this_month = profile.spent_by_category().get(category) or 0
                 
                 category_budget = budget.get(category, 0)
                 if float(spent_this_month) > category_budget:
                     overspend = float(spent_this_month) - category_budget
                     messages.warning(request, f"You've exceeded your {category} budget by ₹{overspend:.2f} this month. Consider adjusting your spending.")
             
-            # Remove item from shopping list
-            item_name = item.name
-            item.delete()
-            
             if item.priority:
-                messages.success(request, f"✅ Successfully purchased essential item '{item_name}' for ₹{item.price}!")
+                messages.success(request, f"✅ Successfully purchased essential item '{item.name}' for ₹{item.price}!")
             else:
-                messages.success(request, f"🛍️ Successfully purchased '{item_name}' for ₹{item.price}!")
-                
-        else:
-            shortage = item.price - profile.total_funds
-            messages.error(request, f"❌ You need ₹{shortage:.2f} more to buy this item. Current balance: ₹{profile.total_funds}")
+                messages.success(request, f"🛍️ Successfully purchased '{item.name}' for ₹{item.price}!")
     
     return redirect(reverse("widget:shopping"))
 
@@ -97,12 +87,25 @@ def remove_item(request, item_id):
     return redirect(reverse("widget:shopping"))
 
 from django.urls import reverse
-from .operations import push_item,list_exists, clean_price_input
+from .operations import (push_item, clean_price_input, get_shopping_list, annotate_affordability,
+                         parse_shopping_file, import_shopping_items, queue_price_fetches, requeue_stale_prices)
+from .finance import FinanceSnapshot, transaction_page
+from .tips import get_smart_tips
+from .analytics import spending_analytics
+from . import search
+from .statements import import_statement
+from .cache import cached_for_user, csrf_variant, page_etag, user_etag
+from .ledger import InsufficientFunds, post_transaction, reverse_transaction, purchase_item
+
+def conditional_page(view):
+    """Revalidate-always HTML page answered with 304 while page_etag() is unchanged"""
+    return cache_control(private=True, no_cache=True)(condition(etag_func=page_etag)(view))
 
 # Create your views here.
 def home(request):
     return render(request,'widget_home.html')
 
+@conditional_page
 def shopping_list(request):
     context = {}
     if request.method == "POST":
@@ -114,74 +117,89 @@ def shopping_list(request):
     if not request.user.is_authenticated:
         return redirect(reverse("main:login"))
     else:
-        le = list_exists(request.user)
-        shopping_items = []
-        if le:
-            from .operations import get_shopping_list
-            shopping_items = get_shopping_list(request.user)
-        context.update({
-            "list_exists": le,
-            "shopping_items": shopping_items
-        })
+        # The table holds CSRF tokens, so copies are kept per CSRF secret
+        context.update(cached_for_user(request.user.pk, "shopping-table",
+                                       lambda: shopping_table(request), variant=csrf_variant(request)))
+        if context["prices_pending"]:
+            # The page refreshes until these resolve; make sure a worker has them
+            requeue_stale_prices(request.user)
     return render(request, 'shopping.html', context=context)
 
-def get_smart_tips(profile):
-    """Generate smart financial tips based on user's spending patterns"""
-    tips = []
+def shopping_table(request):
+    """The rendered shopping list table and the flags the page needs around it"""
+    profile = FinanceProfile.for_user(request.user, create=False)
+    shopping_items = annotate_affordability(get_shopping_list(request.user), profile)
+    return {
+        "list_exists": bool(shopping_items),
+        "prices_pending": any(item.price_pending for item in shopping_items),
+        "shopping_table": render_to_string("shopping_table.html", {"shopping_items": shopping_items}, request),
+    }
+
+def import_shopping_list(request):
+    """Bulk import shopping items from an uploaded CSV, JSON or JSON lines file"""
+    if not request.user.is_authenticated:
+        return redirect(reverse("main:login"))
     
-    # Only give budget advice if they have set monthly income
-    if profile.monthly_income > 0:
-        if profile.financial_score < 60:
-            tips.append("💡 Your spending patterns could improve. Try the 50/30/20 rule: 50% needs, 30% wants, 20% savings.")
-        
-        transactions = profile.transactions.filter(
-            created_at__gte=datetime.datetime.now() - datetime.timedelta(days=30)
-        )
-        
-        wants_spending = transactions.filter(category='wants', transaction_type='debit').aggregate(
-            total=Sum('amount'))['total'] or 0
-        
-        if wants_spending > profile.monthly_income * Decimal('0.4'):
-            tips.append("⚠️ Your entertainment/luxury spending is high. Consider reducing wants to improve financial health.")
-        
-        savings_rate = profile.transactions.filter(category='savings', transaction_type='credit').aggregate(
-            total=Sum('amount'))['total'] or 0
-        
-        if savings_rate < profile.monthly_income * Decimal('0.15'):
-            tips.append("💰 Try to save at least 15% of your income for emergencies and future goals.")
-    else:
-        tips.append("📊 Set your monthly income in the finance settings for personalized budget advice!")
+    upload = request.FILES.get("import-file")
+    if request.method == "POST" and upload:
+        try:
+            with transaction.atomic():
+                created, skipped, pending_ids = import_shopping_items(
+                    request.user, parse_shopping_file(upload.file, upload.name))
+                # Prices are fetched in the background once the import commits
+                queue_price_fetches(pending_ids)
+        except (ValueError, csv.Error) as e:
+            messages.error(request, f"Couldn't read {upload.name}: {e}")
+        else:
+            messages.success(request, f"Imported {created} items ({skipped} rows skipped).")
+    
+    return redirect(reverse("widget:shopping"))
+
+def dashboard_context(user):
+    """Template context of the finance dashboard"""
+    profile = FinanceProfile.for_user(user)
     
-    if profile.total_funds < (profile.monthly_income if profile.monthly_income > 0 else 10000):
-        tips.append("🏦 Build an emergency fund for unexpected expenses and financial security.")
+    # Get recent transactions
+    recent_transactions = list(profile.transactions.all()[:5])
     
-    # Shopping list related tips
-    shopping_items = ShoppingListItem.objects.filter(user=profile.user)
-    if shopping_items.exists():
-        affordable_items = [item for item in shopping_items if profile.total_funds >= item.price]
-        if affordable_items:
-            tips.append(f"🛒 You have funds to buy {len(affordable_items)} items from your shopping list!")
-        
-        needs_items = shopping_items.filter(priority=True)
-        if needs_items.exists():
-            affordable_needs = [item for item in needs_items if profile.total_funds >= item.price]
-            if affordable_needs:
-                tips.append(f"⚡ Focus on your {len(affordable_needs)} affordable essential items first!")
+    # Totals, score and shopping list affordability in two queries
+    snapshot = FinanceSnapshot(profile)
     
-    if not tips:
-        tips.append("🎉 Great job! Your financial habits look healthy. Keep up the good work!")
-        tips.append("📈 Consider investing your savings for long-term wealth building.")
+    # Calculate budget percentages
+    budget_allocation = snapshot.budget_allocation
+    if budget_allocation:  # Check if budget_allocation is not empty
+        needs_percentage = min(100, (float(snapshot.needs_spent) / budget_allocation['needs'] * 100)) if budget_allocation.get('needs', 0) > 0 else 0
+        wants_percentage = min(100, (float(snapshot.wants_spent) / budget_allocation['wants'] * 100)) if budget_allocation.get('wants', 0) > 0 else 0
+        savings_percentage = min(100, (float(snapshot.savings_amount) / budget_allocation['savings'] * 100)) if budget_allocation.get('savings', 0) > 0 else 0
+    else:
+        needs_percentage = wants_percentage = savings_percentage = 0
+        budget_allocation = {'needs': 0, 'wants': 0, 'savings': 0}
     
-    return tips[:4]  # Return max 4 tips
+    context = {
+        'total_funds': snapshot.total_funds,
+        'monthly_income': snapshot.monthly_income,
+        'financial_score': snapshot.financial_score,
+        'budget_allocation': budget_allocation,
+        'needs_spent': snapshot.needs_spent,
+        'wants_spent': snapshot.wants_spent,
+        'savings_amount': snapshot.savings_amount,
+        'needs_percentage': needs_percentage,
+        'wants_percentage': wants_percentage,
+        'savings_percentage': savings_percentage,
+        'recent_transactions': recent_transactions,
+        'smart_tips': get_smart_tips(snapshot),
+        'affordable_items': snapshot.affordable_items,
+        'total_shopping_items': len(snapshot.shopping_items),
+    }
+    return context
 
+@conditional_page
 def finance_view(request):
     if not request.user.is_authenticated:
         return redirect(reverse("main:login"))
     
-    # Get or create finance profile
-    profile, created = FinanceProfile.objects.get_or_create(user=request.user)
-    
     if request.method == "POST":
+        profile = request.finance_profile
         action = request.POST.get("action")
         
         if action == "update_funds":
@@ -191,7 +209,7 @@ def finance_view(request):
                 try:
                     profile.total_funds = Decimal(str(clean_price_input(total_funds)))
                     profile.monthly_income = Decimal(str(clean_price_input(monthly_income)))
-                    profile.save()
+                    profile.save(update_fields=['total_funds', 'monthly_income', 'updated_at'])
                     messages.success(request, "Financial information updated successfully!")
                 except (ValueError, TypeError, InvalidOperation):
                     messages.error(request, "Please enter valid amounts.")
@@ -203,15 +221,7 @@ def finance_view(request):
             if amount and description and category:
                 try:
                     amount_decimal = Decimal(str(clean_price_input(amount)))
-                    Transaction.objects.create(
-                        finance_profile=profile,
-                        amount=amount_decimal,
-                        transaction_type='credit',
-                        category=category,
-                        description=description
-                    )
-                    profile.total_funds += amount_decimal
-                    profile.save()
+                    post_transaction(profile, amount_decimal, 'credit', category, description)
                     messages.success(request, f"Added ₹{amount_decimal} to your account!")
                 except (ValueError, TypeError, InvalidOperation):
                     messages.error(request, "Please enter a valid amount.")
@@ -223,19 +233,10 @@ def finance_view(request):
             if amount and description and category:
                 try:
                     amount_decimal = Decimal(str(clean_price_input(amount)))
-                    if profile.total_funds >= amount_decimal:
-                        Transaction.objects.create(
-                            finance_profile=profile,
-                            amount=amount_decimal,
-                            transaction_type='debit',
-                            category=category,
-                            description=description
-                        )
-                        profile.total_funds -= amount_decimal
-                        profile.save()
-                        messages.success(request, f"Recorded expense of ₹{amount_decimal}")
-                    else:
-                        messages.error(request, "Insufficient funds!")
+                    post_transaction(profile, amount_decimal, 'debit', category, description)
+                    messages.success(request, f"Recorded expense of ₹{amount_decimal}")
+                except InsufficientFunds:
+                    messages.error(request, "Insufficient funds!")
                 except (ValueError, TypeError, InvalidOperation):
                     messages.error(request, "Please enter a valid amount.")
         
@@ -247,79 +248,211 @@ def finance_view(request):
             if amount and description and category and transaction_type:
                 try:
                     amount_decimal = Decimal(str(clean_price_input(amount)))
-                    Transaction.objects.create(
-                        finance_profile=profile,
-                        amount=amount_decimal,
-                        transaction_type=transaction_type,
-                        category=category,
-                        description=description
-                    )
-                    if transaction_type == 'credit':
-                        profile.total_funds += amount_decimal
-                    else:
-                        profile.total_funds -= amount_decimal
-                    profile.save()
+                    # Manual entries may take the balance negative, as before
+                    post_transaction(profile, amount_decimal, transaction_type, category, description,
+                                     allow_overdraft=True)
                     messages.success(request, "Transaction added successfully!")
                 except (ValueError, TypeError, InvalidOperation):
                     messages.error(request, "Please enter a valid amount.")
         
         return redirect(reverse("widget:finance"))
     
-    # Get recent transactions
-    recent_transactions = profile.transactions.all()[:5]
-    
-    # Calculate spending by category (last 30 days)
-    thirty_days_ago = datetime.datetime.now() - datetime.timedelta(days=30)
-    recent_transactions_month = profile.transactions.filter(created_at__gte=thirty_days_ago)
+    # Rebuilt only when the user's data changed, see widgets/cache.py
+    context = cached_for_user(request.user.pk, "dashboard", lambda: dashboard_context(request.user))
     
-    needs_spent = recent_transactions_month.filter(
-        category='needs', transaction_type='debit'
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    return render(request, "finance.html", context)
+
+
+def import_bank_statement(request):
+    """Stream an uploaded CSV bank statement into the user's transactions"""
+    if not request.user.is_authenticated:
+        return redirect(reverse("main:login"))
     
-    wants_spent = recent_transactions_month.filter(
-        category='wants', transaction_type='debit'
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    upload = request.FILES.get("statement-file")
+    if request.method == "POST" and upload:
+        profile = request.finance_profile
+        try:
+            stats = import_statement(profile, upload.file)
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            messages.error(request, f"Couldn't read {upload.name}: {e}")
+        else:
+            messages.success(request, f"Imported {stats['imported']} transactions "
+                                      f"({stats['duplicates']} already imported, {stats['skipped']} rows skipped).")
     
-    savings_amount = recent_transactions_month.filter(
-        category='savings', transaction_type='credit'
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    return redirect(reverse("widget:finance"))
+
+def history_filters(request):
+    """Validated category/type filters from the query string"""
+    category = request.GET.get("category")
+    transaction_type = request.GET.get("type")
+    if category not in dict(Transaction.CATEGORIES):
+        category = None
+    if transaction_type not in dict(Transaction.TRANSACTION_TYPES):
+        transaction_type = None
+    return category, transaction_type
+
+def transaction_history(request):
+    """Full transaction history, paged newest first by cursor"""
+    if not request.user.is_authenticated:
+        return redirect(reverse("main:login"))
     
-    # Calculate budget percentages
-    budget_allocation = profile.budget_allocation
-    if budget_allocation:  # Check if budget_allocation is not empty
-        needs_percentage = min(100, (float(needs_spent) / budget_allocation['needs'] * 100)) if budget_allocation.get('needs', 0) > 0 else 0
-        wants_percentage = min(100, (float(wants_spent) / budget_allocation['wants'] * 100)) if budget_allocation.get('wants', 0) > 0 else 0
-        savings_percentage = min(100, (float(savings_amount) / budget_allocation['savings'] * 100)) if budget_allocation.get('savings', 0) > 0 else 0
-    else:
-        needs_percentage = wants_percentage = savings_percentage = 0
-        budget_allocation = {'needs': 0, 'wants': 0, 'savings': 0}
+    profile = request.finance_profile
+    category, transaction_type = history_filters(request)
+    try:
+        transactions, next_cursor = transaction_page(
+            profile, request.GET.get("cursor"), category, transaction_type)
+    except ValueError:
+        # A mangled cursor just starts again from the newest page
+        transactions, next_cursor = transaction_page(profile, None, category, transaction_type)
     
-    # Generate smart tips
-    smart_tips = get_smart_tips(profile)
+    return render(request, "transactions.html", {
+        "transactions": transactions,
+        "next_cursor": next_cursor,
+        "category": category or "",
+        "transaction_type": transaction_type or "",
+        "categories": Transaction.CATEGORIES,
+        "transaction_types": Transaction.TRANSACTION_TYPES,
+    })
+
+def transaction_history_json(request):
+    """JSON version of transaction_history: ?cursor=&category=&type=&size="""
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "authentication required"}, status=401)
     
-    # Get shopping list items and their affordability
-    shopping_items = ShoppingListItem.objects.filter(user=request.user)
-    affordable_items = [item for item in shopping_items if item.can_afford]
+    profile = request.finance_profile
+    category, transaction_type = history_filters(request)
+    try:
+        size = min(100, max(1, int(request.GET.get("size", 20))))
+    except ValueError:
+        return JsonResponse({"error": "size must be a number"}, status=400)
+    try:
+        transactions, next_cursor = transaction_page(
+            profile, request.GET.get("cursor"), category, transaction_type, size)
+    except ValueError:
+        return JsonResponse({"error": "invalid cursor"}, status=400)
     
-    context = {
-        'total_funds': profile.total_funds,
-        'monthly_income': profile.monthly_income,
-        'financial_score': profile.financial_score,
-        'budget_allocation': budget_allocation,
-        'needs_spent': needs_spent,
-        'wants_spent': wants_spent,
-        'savings_amount': savings_amount,
-        'needs_percentage': needs_percentage,
-        'wants_percentage': wants_percentage,
-        'savings_percentage': savings_percentage,
-        'recent_transactions': recent_transactions,
-        'smart_tips': smart_tips,
-        'affordable_items': affordable_items,
-        'total_shopping_items': shopping_items.count(),
+    return JsonResponse({
+        "results": [{
+            "id": t.id,
+            "amount": str(t.amount),
+            "transaction_type": t.transaction_type,
+            "category": t.category,
+            "description": t.description,
+            "created_at": t.created_at.isoformat(),
+        } for t in transactions],
+        "next_cursor": next_cursor,
+    })
+
+# Read-only JSON for polling clients. The ETag is the user's data version
+# (widgets/cache.py), so an unchanged poll is answered with 304 before any
+# query beyond the session lookup
+
+def api_response(payload):
+    return JsonResponse(payload, json_dumps_params={"separators": (",", ":"), "ensure_ascii": False})
+
+def api_view(view):
+    """Login check, per-user ETag/304 handling and revalidate-always caching"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "authentication required"}, status=401)
+        return view(request, *args, **kwargs)
+    return require_GET(cache_control(private=True, no_cache=True)(condition(etag_func=user_etag)(wrapper)))
+
+def shopping_list_payload(user):
+    profile = FinanceProfile.for_user(user, create=False)
+    return {
+        "items": [{
+            "id": item.id,
+            "name": item.name,
+            "link": item.link,
+            "price": str(item.price),
+            "previous_price": str(item.previous_price) if item.price_dropped else None,
+            "type": "need" if item.priority else "want",
+            "price_status": item.price_status,
+            "can_afford": None if item.price_pending else item.can_afford,
+            "message": None if item.price_pending else item.affordability_message,
+        } for item in annotate_affordability(get_shopping_list(user), profile)],
     }
-    
-    return render(request, "finance.html", context)
 
+def finance_summary_payload(user):
+    profile = FinanceProfile.for_user(user)
+    snapshot = FinanceSnapshot(profile)
+    return {
+        "total_funds": str(snapshot.total_funds),
+        "monthly_income": str(snapshot.monthly_income),
+        "financial_score": snapshot.financial_score,
+        "budget": {category: round(amount, 2) for category, amount in snapshot.budget_allocation.items()},
+        "spent": {
+            "needs": f"{snapshot.needs_spent:.2f}",
+            "wants": f"{snapshot.wants_spent:.2f}",
+            "savings": f"{snapshot.savings_amount:.2f}",
+        },
+        "transaction_count": snapshot.transaction_count,
+        "shopping_items": len(snapshot.shopping_items),
+        "affordable_items": len(snapshot.affordable_items),
+        "tips": get_smart_tips(snapshot),
+    }
+
+@api_view
+def shopping_list_api(request):
+    return api_response(cached_for_user(request.user.pk, "api-shopping", lambda: shopping_list_payload(request.user)))
+
+@api_view
+def finance_summary_api(request):
+    return api_response(cached_for_user(request.user.pk, "api-summary", lambda: finance_summary_payload(request.user)))
+
+@api_view
+def finance_analytics_api(request):
+    """Daily series, rolling averages, burn rate and month-end projection"""
+    return api_response(cached_for_user(request.user.pk, "api-analytics",
+                                        lambda: spending_analytics(request.finance_profile)))
+
+@api_view
+def recent_transactions_api(request):
+    """The newest transactions, ?limit= (default 10, at most 50)"""
+    try:
+        limit = min(50, max(1, int(request.GET.get("limit", 10))))
+    except ValueError:
+        return JsonResponse({"error": "limit must be a number"}, status=400)
+    transactions = Transaction.objects.filter(finance_profile=request.finance_profile)[:limit]
+    return api_response({
+        "results": [{
+            "id": t.id,
+            "amount": str(t.amount),
+            "transaction_type": t.transaction_type,
+            "category": t.category,
+            "description": t.description,
+            "created_at": t.created_at.isoformat(),
+        } for t in transactions],
+    })
+
+def search_result(kind, obj, score):
+    result = {"kind": kind, "id": obj.id, "score": round(-score, 4) if score is not None else None}
+    if kind == "items":
+        result.update(text=obj.name, price=str(obj.price), type="need" if obj.priority else "want", link=obj.link)
+    else:
+        result.update(text=obj.description, amount=str(obj.amount), transaction_type=obj.transaction_type,
+                      category=obj.category, created_at=obj.created_at.isoformat())
+    return result
+
+@api_view
+def search_api(request):
+    """Ranked search over the user's shopping items and transactions: ?q=&kind=&page=&size="""
+    kind = request.GET.get("kind") or None
+    if kind is not None and kind not in search.INDEXES:
+        return JsonResponse({"error": f"kind must be one of {', '.join(search.INDEXES)}"}, status=400)
+    try:
+        page = max(1, int(request.GET.get("page", 1)))
+        size = min(50, max(1, int(request.GET.get("size", 20))))
+    except ValueError:
+        return JsonResponse({"error": "page and size must be numbers"}, status=400)
+    results, has_next = search.search(request.user, request.GET.get("q", ""), kind, page, size)
+    return api_response({
+        "page": page,
+        "next_page": page + 1 if has_next else None,
+        "results": [search_result(*result) for result in results],
+    })
 
 def remove_transaction(request):
     """Remove a transaction and redirect back to finance page"""
@@ -329,24 +462,10 @@ def remove_transaction(request):
             # Get the transaction and verify it belongs to the current user
             transaction = Transaction.objects.get(
                 id=transaction_id, 
-                profile__user=request.user
+                finance_profile=request.finance_profile
             )
-            
-            # Get the profile to update funds
-            profile = FinanceProfile.objects.get(user=request.user)
-            
-            # Reverse the transaction effect on total funds
-            if transaction.transaction_type == 'credit':
-                # If it was a credit, subtract it from total funds
-                profile.total_funds -= transaction.amount
-            else:
-                # If it was a debit, add it back to total funds
-                profile.total_funds += transaction.amount
-            
-            profile.save()
-            
-            # Delete the transaction
-            transaction.delete()
+            # Delete it and undo its effect on total funds
+            reverse_transaction(transaction)
             
             messages.success(request, f'Transaction "{transaction.description}" removed successfully!')
             